@@ -1,23 +1,49 @@
 from flask import (
     Flask, render_template, request, session,
     redirect, url_for, jsonify, send_from_directory,
-    flash
+    flash, g
 )
-from datetime import datetime, timezone
+from datetime import datetime, date, timezone
 import os
 import uuid
 import urllib.parse
+import hashlib
 from dotenv import load_dotenv
+from markupsafe import Markup
 import json
 
 # 🔥 Firebase helpers
 from firebase_config import (
-    get_menu,
+    menu_cache,
+    get_menu_snapshot,
+    invalidate_menu_cache,
     save_order,
     get_all_orders,
+    get_orders_for_day,
+    order_day_key,
+    get_order,
+    update_order,
+    get_orders_changed_since,
+    decode_order_cursor,
+    next_order_cursor,
+    order_change_ms,
+    get_orders_page,
+    iter_orders,
+    iter_orders_for_days,
+    record_order_sale,
+    get_sales_stats,
     get_db,
-    send_push_to_admins
+    send_push_to_admins,
+    start_order_queue,
+    with_sync_stamp
 )
+from menu_catalog import get_catalog
+from pricing import price_cart
+from cart_codec import encode_cart, decode_cart
+from order_events import order_events, order_feed, ORDER_EVENTS_SSE
+from sales_stats import summarize_range
+from order_export import EXPORT_FORMATS, stream_csv, stream_ndjson
+from http_compression import compress_response
 
 # 🔐 Payment system (with fallback)
 try:
@@ -84,6 +110,15 @@ except ImportError as e:
             return decorated_function
         return decorator
 
+# 📊 Sales analytics (needs numpy)
+try:
+    from sales_analytics import build_report, load_frame, default_range
+    from demand_forecast import demand_forecaster, FORECAST_BACKGROUND_UPDATE
+    ANALYTICS_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ Sales analytics not available: {e}")
+    ANALYTICS_AVAILABLE = False
+
 import secrets
 from functools import wraps
 
@@ -122,18 +157,41 @@ if os.environ.get("VERCEL"):  # Check if running on Vercel
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
     print("🌐 Running on Vercel - client-side session mode")
 else:
-    # Local development
-    app.config["SESSION_TYPE"] = "filesystem"
+    # Local development / gunicorn: sessions stored server-side, cookie carries only an id
+    app.config["SESSION_TYPE"] = os.environ.get("SESSION_TYPE", "sqlite")
+    app.config["SESSION_SQLITE_PATH"] = os.environ.get("SESSION_SQLITE_PATH", "flask_session/sessions.sqlite3")
     app.config["PERMANENT_SESSION_LIFETIME"] = 3600
     app.config["SESSION_COOKIE_HTTPONLY"] = True
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
     app.config["SESSION_COOKIE_SECURE"] = False  # HTTPS only in prod
     print("💻 Running locally - standard session mode")
 
+if app.config["SESSION_TYPE"] == "sqlite":
+    from session_store import SqliteSessionInterface
+    app.session_interface = SqliteSessionInterface(app.config["SESSION_SQLITE_PATH"])
+    print(f"🗄️ Server-side sessions in {app.config['SESSION_SQLITE_PATH']}")
+
+# Replay orders spooled by workers that died before committing them
+start_order_queue()
+
+# ------------------ CART STORAGE ------------------
+def get_cart():
+    """Session cart as a fresh {item_id: qty} dict (decodes the compact form)"""
+    return decode_cart(session.get("cart"))
+
+
+def set_cart(cart):
+    """Store the cart in its compact encoding, dropping the key when empty"""
+    if cart:
+        session["cart"] = encode_cart(cart)
+    else:
+        session.pop("cart", None)
+    session.modified = True
+
 # ------------------ CONTEXT ------------------
 @app.context_processor
 def inject_globals():
-    cart = session.get("cart", {})
+    cart = get_cart()
     return {
         "now": datetime.now(timezone.utc),
         "cart_count": sum(cart.values())
@@ -194,27 +252,88 @@ SAMPLE_MENU = [
     {"id": "38", "name": "Aloo Frankie", "price": 60, "category": "Frankie"}
 ]
 
+menu_cache.set_fallback(SAMPLE_MENU)
+
+
+def current_menu():
+    """Menu snapshot pinned for the whole request so every lookup sees one version"""
+    if "menu_snapshot" not in g:
+        g.menu_snapshot = get_menu_snapshot()
+    return g.menu_snapshot
+
+
+def current_catalog():
+    """Id/category indexes for the request's menu snapshot"""
+    return get_catalog(current_menu())
+
 # ------------------ HOME ------------------
+def _template_fingerprint(*names):
+    """Hash of the page templates so a deploy with new markup changes the ETag"""
+    digest = hashlib.sha1()
+    for name in names:
+        with open(os.path.join(app.root_path, app.template_folder, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+INDEX_TEMPLATE_VERSION = _template_fingerprint("base.html", "index.html", "_menu_body.html")
+
+_menu_fragments = {}  # menu version -> rendered menu body
+
+
+def menu_fragment(catalog):
+    """Menu body HTML, rendered once per menu version"""
+    fragment = _menu_fragments.get(catalog.version)
+    if fragment is None:
+        fragment = Markup(render_template(
+            "_menu_body.html",
+            menu_by_category=catalog.by_category
+        ))
+        _menu_fragments.clear()  # only the current version is ever served
+        _menu_fragments[catalog.version] = fragment
+    return fragment
+
+
+def index_etag(menu_version):
+    """Strong ETag over everything the home page depends on, or None if it can't be cached"""
+    if session.get("_flashes"):
+        return None  # flashed messages are shown once, never revalidate them
+
+    cart = get_cart()
+    parts = [
+        INDEX_TEMPLATE_VERSION,
+        menu_version,
+        str(sum(cart.values())),
+        "admin" if session.get("admin") else "guest",
+        str(datetime.now(timezone.utc).year)
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+@app.after_request
+def compress_json(response):
+    return compress_response(request, response)
+
+
 @app.route("/")
 def index():
-    try:
-        menu_items = get_menu()
-        if not menu_items:
-            raise Exception("Empty menu from Firestore")
-    except Exception as e:
-        print("❌ get_menu failed, using SAMPLE_MENU:", e)
-        menu_items = SAMPLE_MENU
-
-    menu_by_category = {}
-    for item in menu_items:
-        menu_by_category.setdefault(
-            item.get("category", "Others"), []
-        ).append(item)
+    snapshot = current_menu()
+    etag = index_etag(snapshot.version)
 
-    return render_template(
-        "index.html",
-        menu_by_category=menu_by_category
-    )
+    if etag and request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        catalog = current_catalog()
+        response = app.make_response(render_template(
+            "index.html",
+            menu_by_category=catalog.by_category,
+            menu_fragment=menu_fragment(catalog)
+        ))
+
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Cookie")
+    return response
 
 # ------------------ CART ------------------
 @app.route("/add_to_cart", methods=["POST"])
@@ -224,28 +343,21 @@ def add_to_cart():
         quantity = int(request.form.get("quantity", 1))
         
         print(f"🛒 Add to cart: item_id={item_id}, quantity={quantity}")
-        print(f"🔍 Session before: {dict(session)}")
         
         if not item_id:
             print("❌ No item_id provided")
             return jsonify({"success": False, "error": "No item ID"})
         
-        # Initialize cart if not exists
-        if "cart" not in session:
-            session["cart"] = {}
-            print("🛒 Initialized new cart")
-        
         # Add/update item
-        current_qty = session["cart"].get(item_id, 0)
-        session["cart"][item_id] = current_qty + quantity
-        session.modified = True
+        cart = get_cart()
+        cart[item_id] = cart.get(item_id, 0) + quantity
+        set_cart(cart)
         
-        print(f"✅ Cart updated: {session['cart']}")
-        print(f"🔍 Session after: {dict(session)}")
+        print(f"✅ Cart updated: {len(cart)} line(s)")
         
         return jsonify({
             "success": True,
-            "cart_count": sum(session["cart"].values()),
+            "cart_count": sum(cart.values()),
             "message": f"Added {quantity} item(s) to cart"
         })
         
@@ -259,67 +371,122 @@ def add_to_cart():
 
 @app.route("/cart")
 def view_cart():
-    cart = session.get("cart", {})
-    cart_items = []
-    total = 0
+    cart = get_cart()
 
-    try:
-        # Get the same menu as the main page
-        menu_items = get_menu()
-        if not menu_items:
-            raise Exception("Empty menu from Firestore")
-    except Exception as e:
-        print("❌ get_menu failed in cart, using SAMPLE_MENU:", e)
-        menu_items = SAMPLE_MENU
-
-    menu_lookup = {i["id"]: i for i in menu_items}
-
-    for item_id, qty in cart.items():
-        if item_id not in menu_lookup:
-            print(f"⚠️ Item {item_id} not found in menu lookup")
-            continue
-
-        item = menu_lookup[item_id]
-        item_total = item["price"] * qty
-        total += item_total
-
-        cart_items.append({
-            "id": item_id,
-            "name": item["name"],
-            "price": item["price"],
-            "quantity": qty,
-            "total": item_total
-        })
+    # Same menu snapshot and pricing as the checkout that follows
+    quote = price_cart(cart, current_catalog())
 
-    print(f"🛒 Cart items: {len(cart_items)}, Total: {total}")
-    return render_template("cart.html", cart_items=cart_items, total=total)
+    print(f"🛒 Cart items: {len(quote.lines)}, Total: {quote.total}")
+    return render_template("cart.html", cart_items=quote.lines, total=quote.total)
 
 @app.route("/update_cart", methods=["POST"])
 def update_cart():
     item_id = request.form.get("item_id")
     change = int(request.form.get("change", 0))
 
-    if "cart" not in session or item_id not in session["cart"]:
+    cart = get_cart()
+    if item_id not in cart:
         return jsonify({"status": "error"})
 
-    session["cart"][item_id] += change
-    if session["cart"][item_id] <= 0:
-        session["cart"].pop(item_id)
+    cart[item_id] += change
+    if cart[item_id] <= 0:
+        cart.pop(item_id)
 
-    session.modified = True
+    set_cart(cart)
     return jsonify({"status": "success"})
 
 @app.route("/remove_from_cart", methods=["POST"])
 def remove_from_cart():
     item_id = request.form.get("item_id")
-    session.get("cart", {}).pop(item_id, None)
-    session.modified = True
+    cart = get_cart()
+    cart.pop(item_id, None)
+    set_cart(cart)
     return jsonify({"status": "success"})
 
+CART_BATCH_MAX_OPERATIONS = 50
+
+
+def apply_cart_operation(cart, op, catalog):
+    """Apply one add/update/remove operation to a cart dict in place"""
+    action = op.get("op")
+    item_id = op.get("item_id")
+    if item_id is None:
+        raise ValueError("item_id is required")
+    item_id = str(item_id)
+
+    if action == "add":
+        quantity = int(op.get("quantity", 1))
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        if item_id not in catalog:
+            raise ValueError(f"Unknown item {item_id}")
+        cart[item_id] = cart.get(item_id, 0) + quantity
+
+    elif action == "update":
+        if item_id not in cart:
+            raise ValueError(f"Item {item_id} is not in the cart")
+        cart[item_id] += int(op.get("change", 0))
+        if cart[item_id] <= 0:
+            cart.pop(item_id)
+
+    elif action == "remove":
+        cart.pop(item_id, None)
+
+    else:
+        raise ValueError(f"Unknown operation {action!r}")
+
+
+@app.route("/cart/batch", methods=["POST"])
+def cart_batch():
+    """Apply a list of cart operations atomically and return the priced cart"""
+    payload = request.get_json(silent=True) or {}
+    operations = payload.get("operations")
+
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"success": False, "error": "operations must be a non-empty list"}), 400
+    if len(operations) > CART_BATCH_MAX_OPERATIONS:
+        return jsonify({"success": False, "error": "Too many operations"}), 400
+
+    catalog = current_catalog()
+    cart = get_cart()
+
+    # Work on a copy so a bad operation leaves the session cart untouched
+    for index, op in enumerate(operations):
+        try:
+            if not isinstance(op, dict):
+                raise ValueError("operation must be an object")
+            apply_cart_operation(cart, op, catalog)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "operation_index": index
+            }), 400
+
+    set_cart(cart)
+
+    quote = price_cart(cart, catalog)
+    return jsonify({
+        "success": True,
+        "cart_count": sum(cart.values()),
+        "items": [
+            {
+                "id": line["id"],
+                "name": line["name"],
+                "quantity": line["quantity"],
+                "total": line["total"]
+            }
+            for line in quote.lines
+        ],
+        "subtotal": quote.subtotal,
+        "total": quote.total,
+        "total_paise": quote.amount_paise
+    })
+
 # ------------------ CREATE ORDER ------------------
 @app.route("/create_order", methods=["POST"])
 def create_order_route():
-    cart = session.get("cart")
+    cart = get_cart()
 
     print("🛒 CART CONTENT:", cart)  # DEBUG
 
@@ -340,33 +507,9 @@ def create_order_route():
     # ✅ CREATE ORDER CODE
     order_code = str(uuid.uuid4())[:8].upper()
 
-    items = []
-    total = 0
-
-    try:
-        # Get the same menu as the main page
-        menu_items = get_menu()
-        if not menu_items:
-            raise Exception("Empty menu from Firestore")
-    except Exception as e:
-        print("❌ get_menu failed in order, using SAMPLE_MENU:", e)
-        menu_items = SAMPLE_MENU
-
-    for item_id, qty in cart.items():
-        item = next((i for i in menu_items if i["id"] == item_id), None)
-        if not item:
-            print(f"⚠️ Item {item_id} not found in menu for order")
-            continue
-
-        item_total = item["price"] * qty
-        total += item_total
-
-        items.append({
-            "name": item["name"],
-            "price": item["price"],
-            "quantity": qty,
-            "total": item_total
-        })
+    quote = price_cart(cart, current_catalog())
+    items = quote.order_items()
+    total = quote.total
 
     order_data = {
         "orderId": order_code,
@@ -417,6 +560,7 @@ def create_order_route():
         "order_id": order_id,
         "order_code": order_code,
         "total": total,
+        "total_paise": quote.amount_paise,
         **transaction_info
     }
 
@@ -542,7 +686,8 @@ def payment():
         try:
             order_result = payment_gateway.create_order(
                 amount=data["total"],
-                receipt=data["order_code"]
+                receipt=data["order_code"],
+                amount_paise=data.get("total_paise")
             )
             
             if not order_result["success"]:
@@ -603,18 +748,17 @@ def confirm_payment():
         return redirect(url_for("index"))
 
     # Update order status to confirmed
-    try:
-        db = get_db()
-        db.collection("orders").document(data["order_id"]).update({
-            "orderStatus": "CONFIRMED",
-            "paymentStatus": "PAID",
-            "paymentVerifiedAt": datetime.now(timezone.utc),
-            "updatedAt": datetime.now(timezone.utc),
-            "paymentMethod": "SIMPLE_UPI"
-        })
+    if update_order(data["order_id"], {
+        "orderStatus": "CONFIRMED",
+        "paymentStatus": "PAID",
+        "paymentVerifiedAt": datetime.now(timezone.utc),
+        "updatedAt": datetime.now(timezone.utc),
+        "paymentMethod": "SIMPLE_UPI"
+    }):
         print("✅ Order confirmed with simple payment")
-    except Exception as e:
-        print(f"❌ Failed to update order: {e}")
+        record_order_sale(data["order_id"], current_catalog())
+    else:
+        print(f"❌ Failed to update order {data['order_id']}")
 
     # Clear pending payment and store last order
     session.pop("pending_payment", None)
@@ -687,25 +831,31 @@ def verify_payment():
         if not signature_valid:
             return jsonify(error_handler.handle_payment_error("INVALID_SIGNATURE")), 400
         
-        # Record payment attempt
-        try:
-            transaction_manager.record_payment_attempt(
-                transaction["transaction_id"],
-                payment_data,
-                request
-            )
-        except Exception as e:
-            print(f"❌ Failed to record payment attempt: {e}")
+        def record_failed_attempt():
+            # Successful attempts are written by commit_payment together with the order
+            try:
+                transaction_manager.record_payment_attempt(
+                    transaction["transaction_id"],
+                    payment_data,
+                    request
+                )
+            except Exception as e:
+                print(f"❌ Failed to record payment attempt: {e}")
         
         # Capture payment with retry logic
         try:
             capture_result = network_handler.with_retry(max_retries=2)(
                 payment_gateway.capture_payment
-            )(payment_data["payment_id"], pending_payment["total"])
+            )(
+                payment_data["payment_id"],
+                pending_payment["total"],
+                amount_paise=pending_payment.get("total_paise")
+            )
         except Exception as e:
             error_response = network_handler.handle_payment_gateway_failure(
                 e, transaction["transaction_id"]
             )
+            record_failed_attempt()
             
             # Update transaction as failed
             try:
@@ -722,6 +872,8 @@ def verify_payment():
             return jsonify(error_response), 500
         
         if not capture_result["success"]:
+            record_failed_attempt()
+            
             # Update transaction as failed
             try:
                 transaction_manager.update_transaction_status(
@@ -739,32 +891,43 @@ def verify_payment():
                 details=capture_result["error"]
             )), 400
         
-        # Update transaction as successful
+        # Attempt, transaction SUCCESS and order CONFIRMED in one atomic write
+        order_changes = {
+            "orderStatus": "CONFIRMED",
+            "paymentStatus": "PAID",
+            "paymentVerifiedAt": datetime.now(timezone.utc),
+            "gatewayPaymentId": payment_data["payment_id"]
+        }
         try:
-            updated_transaction = transaction_manager.update_transaction_status(
+            transaction_manager.commit_payment(
                 transaction["transaction_id"],
-                "SUCCESS",
+                payment_data,
+                request,
+                pending_payment["order_id"],
+                order_changes,
                 gateway_payment_id=payment_data["payment_id"],
                 gateway_signature=payment_data["signature"],
                 payment_captured=True
             )
+            record_order_sale(pending_payment["order_id"], current_catalog())
         except Exception as e:
-            print(f"❌ Failed to update transaction to success: {e}")
-            # Continue anyway since payment was captured
-        
-        # Update order status
-        try:
-            db = get_db()
-            db.collection("orders").document(pending_payment["order_id"]).update({
-                "orderStatus": "CONFIRMED",
-                "paymentStatus": "PAID",
-                "paymentVerifiedAt": datetime.now(timezone.utc),
-                "updatedAt": datetime.now(timezone.utc),
-                "gatewayPaymentId": payment_data["payment_id"]
-            })
-        except Exception as e:
-            print(f"❌ Failed to update order status: {e}")
-            # Continue anyway since payment was successful
+            # The money is captured: fall back to step-by-step writes rather than lose it
+            print(f"❌ Atomic payment commit failed, writing step by step: {e}")
+            try:
+                transaction_manager.update_transaction_status(
+                    transaction["transaction_id"],
+                    "SUCCESS",
+                    gateway_payment_id=payment_data["payment_id"],
+                    gateway_signature=payment_data["signature"],
+                    payment_captured=True
+                )
+            except Exception as update_error:
+                print(f"❌ Failed to update transaction to success: {update_error}")
+            
+            if update_order(pending_payment["order_id"], order_changes):
+                record_order_sale(pending_payment["order_id"], current_catalog())
+            else:
+                print(f"❌ Failed to update order status for {pending_payment['order_id']}")
         
         # Set verified payment session
         session["verified_payment"] = {
@@ -914,50 +1077,189 @@ def admin_approve_payment(order_id):
     if not session.get("admin"):
         return jsonify({"success": False, "error": "Unauthorized"})
     
-    db = get_db()
-    order_doc = db.collection("orders").document(order_id).get()
-    
-    if not order_doc.exists:
+    order = get_order(order_id)
+    if not order:
         return jsonify({"success": False, "error": "Order not found"})
     
     # Update order to PAID
-    db.collection("orders").document(order_id).update({
+    updated = update_order(order_id, {
         "orderStatus": "PAID",
         "paymentStatus": "PAID",
         "paymentVerifiedAt": datetime.now(timezone.utc),
         "updatedAt": datetime.now(timezone.utc)
     })
+    if updated:
+        record_order_sale(order_id, current_catalog(), order)
     
-    return jsonify({"success": True})
+    return jsonify({"success": updated})
 
 @app.route("/admin/reject_payment/<order_id>", methods=["POST"])
 def admin_reject_payment(order_id):
     if not session.get("admin"):
         return jsonify({"success": False, "error": "Unauthorized"})
     
-    db = get_db()
-    order_doc = db.collection("orders").document(order_id).get()
-    
-    if not order_doc.exists:
+    if not get_order(order_id):
         return jsonify({"success": False, "error": "Order not found"})
     
     # Update order to REJECTED
-    db.collection("orders").document(order_id).update({
+    updated = update_order(order_id, {
         "orderStatus": "PAYMENT_REJECTED",
         "paymentStatus": "REJECTED",
         "paymentRejectedAt": datetime.now(timezone.utc),
         "updatedAt": datetime.now(timezone.utc)
     })
     
-    return jsonify({"success": True})
+    return jsonify({"success": updated})
+
+@app.route("/admin/stats")
+def admin_stats():
+    """Pre-aggregated sales per day for ?from=&to= (YYYY-MM-DD, default today)"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    today = order_day_key()
+    start_day = request.args.get("from", today)
+    end_day = request.args.get("to", start_day)
+    try:
+        date.fromisoformat(start_day)
+        date.fromisoformat(end_day)
+    except ValueError:
+        return jsonify({"success": False, "error": "from/to must be YYYY-MM-DD"}), 400
+
+    days = get_sales_stats(start_day, end_day)
+    return jsonify({
+        "success": True,
+        "from": start_day,
+        "to": end_day,
+        "days": days,
+        "totals": summarize_range(days)
+    })
+
+@app.route("/admin/analytics")
+def admin_analytics():
+    """Hourly revenue, top items, basket pairs and payment outcomes for ?from=&to= (default last 30 days)"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    if not ANALYTICS_AVAILABLE:
+        return jsonify({"success": False, "error": "Analytics not available"}), 503
+
+    default_start, default_end = default_range()
+    start_day = request.args.get("from", default_start)
+    end_day = request.args.get("to", default_end if "from" not in request.args else start_day)
+    try:
+        date.fromisoformat(start_day)
+        date.fromisoformat(end_day)
+    except ValueError:
+        return jsonify({"success": False, "error": "from/to must be YYYY-MM-DD"}), 400
+
+    top = min(request.args.get("top", 10, type=int), 50)
+    try:
+        report = build_report(load_frame(start_day, end_day, current_catalog()), top)
+    except Exception as e:
+        print("❌ admin_analytics error:", e)
+        return jsonify({"success": False, "error": "Analytics failed"}), 500
+
+    return jsonify({"success": True, "from": start_day, "to": end_day, **report})
+
+@app.route("/admin/forecast")
+def admin_forecast():
+    """Expected quantity per menu item for the next hour and for tomorrow (kitchen prep)"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    if not ANALYTICS_AVAILABLE:
+        return jsonify({"success": False, "error": "Forecasting not available"}), 503
+
+    try:
+        # Folding days can take a while (56 day reads on the first run), so it never
+        # happens in the request: serve the current model and catch up in the background
+        catalog = current_catalog()
+        behind = demand_forecaster.is_behind()
+        if behind and FORECAST_BACKGROUND_UPDATE:
+            demand_forecaster.update_async(catalog)
+        forecast = demand_forecaster.forecast(catalog)
+    except Exception as e:
+        print("❌ admin_forecast error:", e)
+        return jsonify({"success": False, "error": "Forecast failed"}), 500
+
+    return jsonify({"success": True, "behind": behind, **forecast})
+
+@app.route("/admin/gateway/metrics")
+def admin_gateway_metrics():
+    """Payment gateway call latency and keep-alive connection reuse for this worker"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    if not PAYMENT_SYSTEM_AVAILABLE:
+        return jsonify({"success": False, "error": "Payment system not available"}), 503
+
+    return jsonify({"success": True, **payment_gateway.client.metrics()})
+
+@app.route("/admin/menu/invalidate", methods=["POST"])
+def admin_invalidate_menu():
+    """Reload the menu now; other workers pick it up within MENU_MARKER_CHECK_INTERVAL"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    snapshot = invalidate_menu_cache()
+    return jsonify({
+        "success": True,
+        "menu_version": snapshot.version,
+        "items": len(snapshot.items)
+    })
 
 @app.route("/admin/dashboard")
 def admin_dashboard():
     if not session.get("admin"):
         return redirect(url_for("admin"))
     
-    today_date = datetime.now().strftime("%B %d, %Y")  # e.g., "February 20, 2026"
-    return render_template("admin_dashboard.html", today_date=today_date)
+    today_date = datetime.fromisoformat(order_day_key()).strftime("%B %d, %Y")  # e.g., "February 20, 2026"
+    return render_template(
+        "admin_dashboard.html",
+        today_date=today_date,
+        today_key=order_day_key(),
+        live_stream=ORDER_EVENTS_SSE
+    )
+
+def orders_etag(orders, *extra):
+    """Weak ETag over how many orders there are and when the newest change happened"""
+    newest = max((order_change_ms(o) for o in orders), default=0)
+    parts = [str(len(orders)), str(newest), *(str(e) for e in extra)]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def orders_json(payload, orders, *extra):
+    """jsonify(payload), or an empty 304 when the client already has this version"""
+    etag = orders_etag(orders, *extra)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _orders_delta_response(full_loader, day=None):
+    """Legacy array without ?since=, otherwise {"orders", "next_cursor"} (full list when since is empty)"""
+    since = request.args.get("since")
+    if since is None:
+        orders = full_loader()
+        return orders_json(orders, orders)
+
+    if since:
+        try:
+            since_ms, since_id = decode_order_cursor(since)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        orders = get_orders_changed_since(since_ms, since_id, day=day)
+    else:
+        orders = full_loader()
+
+    next_cursor = next_order_cursor(orders, since or None)
+    return orders_json({"orders": orders, "next_cursor": next_cursor}, orders, next_cursor)
+
 
 @app.route("/admin/orders/live")
 def admin_live_orders():
@@ -965,54 +1267,79 @@ def admin_live_orders():
         return jsonify([])
 
     try:
-        orders = get_all_orders()
-        
-        # Filter orders for today only
-        today = datetime.now().date().isoformat()
-        today_orders = []
-        
-        for order in orders:
-            if order.get("createdAt"):
-                # Handle different timestamp formats
-                order_date = None
-                
-                if hasattr(order["createdAt"], "seconds"):
-                    # Firebase timestamp
-                    order_date = datetime.fromtimestamp(order["createdAt"].seconds).date().isoformat()
-                elif isinstance(order["createdAt"], str):
-                    # ISO string from local files
-                    try:
-                        order_date = datetime.fromisoformat(order["createdAt"]).date().isoformat()
-                    except:
-                        # Try parsing from local files with savedAt
-                        if "savedAt" in order:
-                            try:
-                                order_date = datetime.fromisoformat(order["savedAt"]).date().isoformat()
-                            except:
-                                continue
-                elif isinstance(order["createdAt"], datetime):
-                    # Direct datetime object
-                    order_date = order["createdAt"].date().isoformat()
-                
-                if order_date == today:
-                    today_orders.append(order)
-        
-        print(f"📊 Today's orders: {len(today_orders)}")
-        return jsonify(today_orders)
+        today = order_day_key()
+
+        def load_today():
+            # Indexed lookup on the business-day key: cost follows today's volume only
+            today_orders = get_orders_for_day(today)
+            print(f"📊 Today's orders: {len(today_orders)}")
+            return today_orders
+
+        return _orders_delta_response(load_today, day=today)
 
     except Exception as e:
         print("❌ admin_live_orders error:", e)
         return jsonify([])
 
 
+@app.route("/admin/orders/stream")
+def admin_orders_stream():
+    """Server-Sent Events feed of new orders and status changes for the dashboard"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    if not ORDER_EVENTS_SSE:
+        return jsonify({"success": False, "error": "Live stream disabled"}), 503
+
+    order_feed.ensure_running()
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    response = app.response_class(
+        order_events.stream(last_event_id),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+def _stream_orders_json(orders):
+    """Emit a JSON array one order at a time so memory stays flat however long the history"""
+    yield "["
+    for i, order in enumerate(orders):
+        yield ("," if i else "") + app.json.dumps(order)
+    yield "]"
+
+
 @app.route("/admin/orders/all")
 def admin_all_orders():
+    """Legacy latest-100 array; ?cursor=&limit= for keyset pages, ?stream=1 for the full history"""
     if not session.get("admin"):
         return jsonify([])
 
     try:
+        if request.args.get("since") is not None:
+            return _orders_delta_response(get_all_orders)
+
+        cursor = request.args.get("cursor") or None
+        if cursor:
+            try:
+                decode_order_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+
+        if request.args.get("stream") == "1":
+            return app.response_class(
+                _stream_orders_json(iter_orders(cursor)),
+                mimetype="application/json"
+            )
+
+        if cursor or "limit" in request.args:
+            limit = request.args.get("limit", 100, type=int)
+            orders, next_cursor = get_orders_page(cursor, limit)
+            return orders_json({"orders": orders, "next_cursor": next_cursor}, orders, next_cursor)
+
         orders = get_all_orders()
-        return jsonify(orders)
+        return orders_json(orders, orders)
 
     except Exception as e:
         print("❌ admin_all_orders error:", e)
@@ -1020,6 +1347,38 @@ def admin_all_orders():
 
 
 
+@app.route("/admin/orders/export")
+def admin_export_orders():
+    """Stream ?from=&to= (business days) as CSV or NDJSON, one row per line item"""
+    if not session.get("admin"):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    today = order_day_key()
+    start_day = request.args.get("from", today)
+    end_day = request.args.get("to", today)
+    export_format = request.args.get("format", "csv").lower()
+    try:
+        date.fromisoformat(start_day)
+        date.fromisoformat(end_day)
+    except ValueError:
+        return jsonify({"success": False, "error": "from/to must be YYYY-MM-DD"}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    orders = iter_orders_for_days(start_day, end_day)
+    if export_format == "csv":
+        body, mimetype = stream_csv(orders), "text/csv"
+    else:
+        body, mimetype = stream_ndjson(orders), "application/x-ndjson"
+
+    response = app.response_class(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="orders-{start_day}-to-{end_day}.{export_format}"'
+    )
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
 @app.route("/admin/logout")
 def admin_logout():
     session.clear()
@@ -1089,14 +1448,14 @@ def test_simulate_payment(transaction_id):
         
         # Update order status
         db = get_db()
-        db.collection("orders").document(transaction["order_id"]).update({
+        db.collection("orders").document(transaction["order_id"]).update(with_sync_stamp({
             "orderStatus": "CONFIRMED",
             "paymentStatus": "PAID",
             "paymentVerifiedAt": datetime.now(timezone.utc),
             "updatedAt": datetime.now(timezone.utc),
             "gatewayPaymentId": mock_payment_id,
             "testMode": True
-        })
+        }))
         
         return jsonify({
             "success": True,
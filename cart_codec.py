@@ -0,0 +1,89 @@
+import base64
+from functools import lru_cache
+
+# Encoded carts look like "c1:<base64url>" where the payload is a list of
+# (menu id, quantity) pairs written as unsigned LEB128 varints, sorted by id.
+CART_SCHEMA_VERSION = 1
+CART_PREFIX = f"c{CART_SCHEMA_VERSION}:"
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated cart payload")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _integer_id(item_id):
+    """Menu id as int, or None if it can't round-trip through the compact form"""
+    item_id = str(item_id)
+    if not item_id.isdigit() or str(int(item_id)) != item_id:
+        return None
+    return int(item_id)
+
+
+def encode_cart(cart):
+    """Encode a {item_id: qty} cart; falls back to the plain dict for non-integer ids"""
+    pairs = []
+    for item_id, qty in cart.items():
+        numeric_id = _integer_id(item_id)
+        if numeric_id is None or not isinstance(qty, int) or qty < 0:
+            return dict(cart)
+        pairs.append((numeric_id, qty))
+
+    out = bytearray()
+    for numeric_id, qty in sorted(pairs):
+        _write_varint(out, numeric_id)
+        _write_varint(out, qty)
+
+    return CART_PREFIX + base64.urlsafe_b64encode(bytes(out)).decode("ascii").rstrip("=")
+
+
+@lru_cache(maxsize=1024)
+def _decode_payload(payload):
+    data = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+    pairs = []
+    pos = 0
+    while pos < len(data):
+        numeric_id, pos = _read_varint(data, pos)
+        qty, pos = _read_varint(data, pos)
+        pairs.append((str(numeric_id), qty))
+    return tuple(pairs)
+
+
+def decode_cart(value):
+    """Decode a stored cart into a fresh dict, accepting the legacy dict format"""
+    if not value:
+        return {}
+
+    if isinstance(value, dict):
+        # Legacy format: plain {str id: int qty}
+        return {str(item_id): int(qty) for item_id, qty in value.items()}
+
+    if isinstance(value, str) and value.startswith(CART_PREFIX):
+        try:
+            return dict(_decode_payload(value[len(CART_PREFIX):]))
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Discarding unreadable cart: {e}")
+            return {}
+
+    print(f"⚠️ Unknown cart format: {type(value).__name__}")
+    return {}
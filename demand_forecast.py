@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from firebase_config import (
+    get_db,
+    get_orders_for_days,
+    order_day_key,
+    order_local_hour
+)
+from sales_analytics import OrderFrame
+from runtime_env import long_lived_feature
+
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))  # weight of the newest day
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "56"))  # first run looks back this far
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "300"))  # seconds
+FORECAST_STATE_PATH = os.getenv(
+    "FORECAST_STATE_PATH",
+    os.path.join(os.getenv("ORDER_LOG_DIR", "local_orders"), "demand_forecast.json")
+)
+FORECAST_STATE_VERSION = 1
+# Catch up in a background thread when the admin forecast is requested; otherwise
+# run `python demand_forecast.py` on a schedule
+FORECAST_BACKGROUND_UPDATE = long_lived_feature("FORECAST_BACKGROUND_UPDATE")
+
+SLOTS = 7 * 24  # weekday x hour
+
+
+class DemandForecaster:
+    """Per-item demand for every weekday-hour slot, smoothed one day at a time
+
+    Each finished business day updates only its own weekday's 24 slots:
+    level = alpha * observed + (1 - alpha) * level, seeded by the first
+    observation. The state remembers the last folded day, so a run only reads
+    the days that closed since the previous one. Days with no orders at all
+    are treated as closed and skipped; a day whose read fails is not, and
+    the run stops there so the next one retries it. Folding happens outside
+    the read lock, so forecast() keeps serving the previous state meanwhile.
+    """
+
+    def __init__(self, alpha=FORECAST_ALPHA, history_days=FORECAST_HISTORY_DAYS,
+                 state_path=FORECAST_STATE_PATH, cache_ttl=FORECAST_CACHE_TTL):
+        self.alpha = alpha
+        self.history_days = history_days
+        self.state_path = state_path
+        self.cache_ttl = cache_ttl
+
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()  # one fold run at a time
+        self._state = None
+        self._cache = None  # (menu version, computed_at monotonic, forecast)
+
+    # ---------------- PUBLIC ----------------
+    def update(self, through_day=None, catalog=None):
+        """Fold every finished day up to through_day (default yesterday); returns days folded
+
+        The menu catalog maps older line items that have no id to menu items.
+
+        Raises if the stored state or a day's orders can't be read; days
+        folded before the failure are saved, the failed one is retried next run.
+        """
+        through_day = through_day or (date.fromisoformat(order_day_key()) - timedelta(days=1)).isoformat()
+
+        with self._update_lock:
+            # Fresh copy: another worker or the CLI may have folded days since
+            state = self._load_state() or self._empty_state()
+            if state["lastDay"]:
+                start = date.fromisoformat(state["lastDay"]) + timedelta(days=1)
+            else:
+                start = date.fromisoformat(through_day) - timedelta(days=self.history_days - 1)
+            end = date.fromisoformat(through_day)
+            if start > end:
+                return 0
+
+            folded = 0
+            failure = None
+            day = start
+            while day <= end:
+                try:
+                    if self._fold_day(state, day.isoformat(), catalog):
+                        folded += 1
+                except Exception as e:
+                    failure = e
+                    break
+                state["lastDay"] = day.isoformat()
+                day += timedelta(days=1)
+
+            if day > start:
+                self._save_state(state)
+                with self._lock:
+                    self._state = state
+                    self._cache = None
+            if failure is not None:
+                print(f"❌ Demand forecast stopped at {day.isoformat()}: {failure}")
+                raise failure
+
+            print(f"📈 Demand forecast updated through {through_day} ({folded} trading day(s))")
+            return folded
+
+    def update_async(self, catalog=None):
+        """Run update() in a background thread unless one is already running"""
+        if self._update_lock.locked():
+            return False
+
+        def run():
+            try:
+                self.update(catalog=catalog)
+            except Exception as e:
+                print(f"❌ Background demand forecast update failed: {e}")
+
+        threading.Thread(target=run, name="demand-forecast", daemon=True).start()
+        return True
+
+    def forecast(self, catalog, now=None):
+        """Next-hour and next-day expected quantities for every menu item (cached)"""
+        with self._lock:
+            cached = self._cache
+            if (now is None and cached and cached[0] == catalog.version
+                    and time.monotonic() - cached[1] < self.cache_ttl):
+                return cached[2]
+
+            if now is None:
+                self._state = None  # pick up days folded by other workers
+            state = self._ensure_state()
+            result = self._forecast(state, catalog, now)
+            if now is None:
+                self._cache = (catalog.version, time.monotonic(), result)
+            return result
+
+    def is_behind(self):
+        """True when at least one finished day has not been folded in yet"""
+        yesterday = (date.fromisoformat(order_day_key()) - timedelta(days=1)).isoformat()
+        with self._lock:
+            last_day = self._ensure_state()["lastDay"]
+        return not last_day or last_day < yesterday
+
+    # ---------------- MODEL ----------------
+    def _fold_day(self, state, day, catalog=None):
+        orders = get_orders_for_days(day, day, fallback=False)
+        if not orders:
+            return False
+
+        frame = OrderFrame(orders, catalog)
+        paid = frame.paid_lines()
+        rows = np.array([self._item_row(state, item_id) for item_id in frame.item_ids], dtype=np.int32)
+        levels = state["levels"]
+
+        observed = np.zeros((len(levels), 24), dtype=np.float64)
+        if paid.any():
+            np.add.at(
+                observed,
+                (rows[frame.item[paid]], frame.hour[frame.order_index[paid]]),
+                frame.quantity[paid]
+            )
+
+        weekday = date.fromisoformat(day).weekday()
+        window = slice(weekday * 24, weekday * 24 + 24)
+        if state["observed"][weekday] == 0:
+            levels[:, window] = observed
+        else:
+            levels[:, window] = self.alpha * observed + (1 - self.alpha) * levels[:, window]
+        state["observed"][weekday] += 1
+        return True
+
+    def _item_row(self, state, item_id):
+        row = state["rows"].get(item_id)
+        if row is None:
+            row = state["rows"][item_id] = len(state["rows"])
+            state["levels"] = np.vstack([state["levels"], np.zeros((1, SLOTS))])
+        return row
+
+    def _forecast(self, state, catalog, now):
+        now = now or datetime.now(timezone.utc)
+        now_ms = int(now.timestamp() * 1000)
+        today = date.fromisoformat(order_day_key(now))
+        tomorrow = today + timedelta(days=1)
+
+        next_hour = order_local_hour(now_ms) + 1
+        next_hour_day = today
+        if next_hour == 24:
+            next_hour, next_hour_day = 0, tomorrow
+
+        hour_slot = next_hour_day.weekday() * 24 + next_hour
+        day_window = slice(tomorrow.weekday() * 24, tomorrow.weekday() * 24 + 24)
+
+        items = []
+        for item in catalog.items:
+            item_id = str(item["id"])
+            row = state["rows"].get(item_id)
+            hourly = state["levels"][row, day_window] if row is not None else np.zeros(24)
+            items.append({
+                "id": item_id,
+                "name": item.get("name", item_id),
+                "category": item.get("category", "Others"),
+                "nextHour": round(float(state["levels"][row, hour_slot]), 1) if row is not None else 0.0,
+                "nextDay": round(float(hourly.sum()), 1),
+                "hourly": [round(float(q), 1) for q in hourly]
+            })
+        items.sort(key=lambda i: -i["nextDay"])
+
+        return {
+            "basedOn": state["lastDay"],
+            "nextHour": {"day": next_hour_day.isoformat(), "hour": next_hour},
+            "nextDay": tomorrow.isoformat(),
+            "items": items
+        }
+
+    # ---------------- STATE ----------------
+    def _ensure_state(self):
+        if self._state is None:
+            self._state = self._load_state() or self._empty_state()
+        return self._state
+
+    @staticmethod
+    def _empty_state():
+        return {
+            "lastDay": None,
+            "observed": [0] * 7,
+            "rows": {},
+            "levels": np.zeros((0, SLOTS))
+        }
+
+    def _load_state(self):
+        """Stored state, or None if there is none yet; read errors propagate
+
+        Treating a failed read as "no state" would let the next save wipe the model.
+        """
+        db = get_db()
+        if db:
+            doc = db.collection("analytics").document("demand_forecast").get()
+            raw = doc.to_dict() if doc.exists else None
+        else:
+            try:
+                with open(self.state_path, encoding="utf-8") as f:
+                    raw = json.load(f)
+            except FileNotFoundError:
+                raw = None
+        if raw is None:
+            return None
+
+        if raw.get("version") != FORECAST_STATE_VERSION:
+            return None
+        item_ids = list(raw.get("items", {}))
+        levels = np.array([raw["items"][item_id] for item_id in item_ids], dtype=np.float64).reshape(-1, SLOTS)
+        return {
+            "lastDay": raw.get("lastDay"),
+            "observed": list(raw.get("observed", [0] * 7)),
+            "rows": {item_id: row for row, item_id in enumerate(item_ids)},
+            "levels": levels
+        }
+
+    def _save_state(self, state):
+        # Firestore has no nested arrays, so each item keeps one flat 168-slot list
+        raw = {
+            "version": FORECAST_STATE_VERSION,
+            "lastDay": state["lastDay"],
+            "observed": state["observed"],
+            "items": {
+                item_id: [round(float(q), 4) for q in state["levels"][row]]
+                for item_id, row in state["rows"].items()
+            }
+        }
+
+        db = get_db()
+        if db:
+            # No local fallback: a stale Firestore copy would get its days folded twice
+            db.collection("analytics").document("demand_forecast").set(raw)
+            return
+
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(raw, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"❌ Local forecast state write failed: {e}")
+            raise
+
+
+# Global demand forecaster instance
+demand_forecaster = DemandForecaster()
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold finished days into the demand forecast")
+    parser.add_argument("--through", help="last business day to fold in (default yesterday)")
+    parser.add_argument("--print", action="store_true", help="print the resulting forecast")
+    args = parser.parse_args(argv)
+
+    from firebase_config import get_menu_snapshot
+    from menu_catalog import get_catalog
+    catalog = get_catalog(get_menu_snapshot())
+
+    demand_forecaster.update(args.through, catalog)
+
+    if args.print:
+        forecast = demand_forecaster.forecast(catalog)
+        json.dump(forecast, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
 import os
+import sys
+import json
+import argparse
+import time
+import hashlib
+import threading
 import firebase_admin
 from firebase_admin import credentials, firestore, messaging
-from datetime import timezone
+from google.api_core.exceptions import NotFound
+from datetime import datetime, timezone, timedelta
+from order_queue import order_queue, ORDER_SYNC_FIELD, with_sync_stamp
+from order_log import OrderLog
+from sales_stats import SalesStats
+from order_events import publish_order_created, publish_order_updated
+from runtime_env import long_lived_feature
 
 _db = None
 
@@ -63,8 +75,289 @@ def get_menu():
     return []
 
 
+# ---------------- MENU CACHE ----------------
+MENU_CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "300"))  # seconds
+MENU_MARKER_CHECK_INTERVAL = float(os.getenv("MENU_MARKER_CHECK_INTERVAL", "10"))  # seconds
+MENU_MARKER_PATH = os.path.join(os.getenv("ORDER_LOG_DIR", "local_orders"), "menu_invalidated")
+
+
+class MenuSnapshot:
+    """Menu items as loaded at one point in time, tagged with a content version"""
+
+    def __init__(self, items, version, loaded_at):
+        self.items = items
+        self.version = version
+        self.loaded_at = loaded_at
+
+    def is_stale(self, ttl):
+        return time.monotonic() - self.loaded_at > ttl
+
+
+class MenuMarker:
+    """Shared "menu changed" stamp, so an invalidation on one worker reaches all of them
+
+    Kept in Firestore (config/menu_cache) when available, else in a file next
+    to the local order log, which covers workers on the same machine.
+    """
+
+    def __init__(self, get_db, path=MENU_MARKER_PATH):
+        self.get_db = get_db
+        self.path = path
+
+    def read(self):
+        """Epoch ms of the last invalidation, 0 if there never was one"""
+        db = self.get_db()
+        if db:
+            try:
+                doc = db.collection("config").document("menu_cache").get()
+                return (doc.to_dict() or {}).get("invalidatedAt", 0) if doc.exists else 0
+            except Exception as e:
+                print(f"❌ Firebase menu marker read failed: {e}")
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def touch(self):
+        stamp = int(time.time() * 1000)
+        db = self.get_db()
+        if db:
+            try:
+                db.collection("config").document("menu_cache").set({"invalidatedAt": stamp})
+                return stamp
+            except Exception as e:
+                print(f"❌ Firebase menu marker write failed: {e}")
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(str(stamp))
+        except OSError as e:
+            print(f"❌ Local menu marker write failed: {e}")
+        return stamp
+
+
+class MenuCache:
+    """Per-worker menu cache with TTL and stale-while-refresh reloads
+
+    With a marker, each worker also checks the shared invalidation stamp every
+    few seconds (in the background) and reloads as soon as another worker
+    invalidated, instead of waiting out the TTL.
+    """
+
+    def __init__(self, loader, ttl=MENU_CACHE_TTL, marker=None, marker_check=MENU_MARKER_CHECK_INTERVAL):
+        self._loader = loader
+        self.ttl = ttl
+        self._marker = marker
+        self.marker_check = marker_check
+        self._fallback = ()
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._marker_seen = 0
+        self._marker_checked = time.monotonic()
+        self._checking = False
+
+    def set_fallback(self, items):
+        """Items served whenever the loader fails or returns an empty menu"""
+        self._fallback = tuple(items)
+        self._snapshot = None
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._refresh()
+
+        if snapshot.is_stale(self.ttl):
+            # Serve the stale snapshot, reload in the background
+            self._refresh_async()
+        elif self._marker and time.monotonic() - self._marker_checked > self.marker_check:
+            self._check_marker_async()
+
+        return snapshot
+
+    def invalidate(self):
+        """Drop the cached menu and reload it now, on every worker (used after admin edits)"""
+        if self._marker:
+            self._marker.touch()
+        self._snapshot = None
+        snapshot = self._refresh()
+        print(f"🔄 Menu cache invalidated, version {snapshot.version}")
+        return snapshot
+
+    def _load(self):
+        try:
+            items = self._loader()
+            if not items:
+                raise Exception("Empty menu from Firestore")
+        except Exception as e:
+            print("❌ get_menu failed, using SAMPLE_MENU:", e)
+            items = self._fallback
+
+        items = tuple(items)
+        payload = json.dumps(items, sort_keys=True, default=str)
+        version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+        return MenuSnapshot(items, version, time.monotonic())
+
+    def _refresh(self):
+        with self._lock:
+            if self._marker:
+                # Read before loading, so an invalidation racing the load is seen next check
+                self._marker_seen = self._marker.read()
+                self._marker_checked = time.monotonic()
+            self._snapshot = self._load()
+            return self._snapshot
+
+    def _check_marker_async(self):
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+            self._marker_checked = time.monotonic()
+
+        def run():
+            try:
+                if self._marker.read() > self._marker_seen:
+                    snapshot = self._refresh()
+                    print(f"🔄 Menu invalidated by another worker, version {snapshot.version}")
+            except Exception as e:
+                print(f"❌ Menu marker check failed: {e}")
+            finally:
+                self._checking = False
+
+        threading.Thread(target=run, name="menu-marker", daemon=True).start()
+
+    def _refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="menu-refresh", daemon=True).start()
+
+
+menu_cache = MenuCache(get_menu, marker=MenuMarker(get_db))
+
+
+def get_menu_snapshot():
+    return menu_cache.get_snapshot()
+
+
+def get_menu_version():
+    return menu_cache.get_snapshot().version
+
+
+def invalidate_menu_cache():
+    return menu_cache.invalidate()
+
+
+# ---------------- ORDER DAYS ----------------
+ORDER_TIMEZONE = os.getenv("ORDER_TIMEZONE", "Asia/Kolkata")
+
+try:
+    from zoneinfo import ZoneInfo
+    _order_tz = ZoneInfo(ORDER_TIMEZONE)
+except Exception as e:
+    # No tz database available (slim images): the shop runs on IST
+    print(f"⚠️ Timezone {ORDER_TIMEZONE} unavailable ({e}), using UTC+05:30")
+    _order_tz = timezone(timedelta(hours=5, minutes=30))
+
+
+def order_day_key(moment=None):
+    """Business-day bucket (YYYY-MM-DD in ORDER_TIMEZONE) for a datetime, default now"""
+    if moment is None:
+        moment = datetime.now(timezone.utc)
+    elif moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)  # naive values are stored as UTC
+    return moment.astimezone(_order_tz).date().isoformat()
+
+
+def order_local_hour(created_ms):
+    """Hour of day (0-23) in ORDER_TIMEZONE for an epoch-ms timestamp"""
+    return datetime.fromtimestamp(created_ms / 1000, tz=_order_tz).hour
+
+
+def _local_order_day(order_data):
+    """Day key for a local log record; older records only carry savedAt"""
+    if order_data.get("createdDay"):
+        return order_data["createdDay"]
+    try:
+        return order_day_key(datetime.fromisoformat(order_data["savedAt"]))
+    except (KeyError, TypeError, ValueError):
+        return ""
+
+
+def stamp_order_time(order_data):
+    """Give an order its canonical createdAtMs (UTC epoch ms) and matching createdDay
+
+    Every write path calls this once, so readers sort and bucket on these two
+    fields instead of parsing whatever timestamp type the backend returned.
+    """
+    if not order_data.get("createdAtMs"):
+        created_at = order_data.get("createdAt")
+        if not isinstance(created_at, datetime):
+            created_at = datetime.now(timezone.utc)
+        order_data["createdAtMs"] = epoch_ms(created_at)
+    if not order_data.get("createdDay"):
+        order_data["createdDay"] = order_day_key(
+            datetime.fromtimestamp(order_data["createdAtMs"] / 1000, tz=timezone.utc)
+        )
+    return order_data
+
+
 # ---------------- ORDERS ----------------
+order_log = OrderLog(day_of=_local_order_day)
+
+ORDER_WRITE_BEHIND = long_lived_feature("ORDER_WRITE_BEHIND")
+ORDER_COMMIT_WAIT = float(os.getenv("ORDER_COMMIT_WAIT", "10"))  # seconds an update waits for a queued order
+ORDER_NOT_FOUND_RETRIES = 3  # another worker's queued order may land a moment later
+
+
+def start_order_queue():
+    """Start the write-behind writer at app startup, replaying orders spooled by dead workers"""
+    if not ORDER_WRITE_BEHIND:
+        return False
+    db = get_db()
+    if not db:
+        return False
+    return order_queue.start(db)
+
+
+def ensure_order_committed(order_id, timeout=ORDER_COMMIT_WAIT):
+    """Wait until a write-behind order is in Firestore, so it can be updated there"""
+    if str(order_id).startswith("local_"):
+        return True
+    committed = order_queue.wait_committed(order_id, timeout)
+    if not committed:
+        print(f"⚠️ Queued order {order_id} still not committed after {timeout}s")
+    return committed
+
+
 def save_order(order_data):
+    stamp_order_time(order_data)
+    placed_at = datetime.fromtimestamp(order_data["createdAtMs"] / 1000, tz=timezone.utc)
+    order_data.setdefault("updatedAt", placed_at)  # delta sync cursors key off updatedAt
+
+    order_id = _save_order(order_data)
+    if order_id:
+        # SERVER_TIMESTAMP is only a sentinel here; dashboards get the local time
+        created_at = order_data.get("createdAt")
+        publish_order_created(order_id, {
+            **order_data,
+            "createdAt": created_at if isinstance(created_at, datetime) else placed_at
+        })
+    return order_id
+
+
+def _save_order(order_data):
     try:
         print("🔥 Attempting to save order to Firebase...")
         db = get_db()
@@ -81,9 +374,17 @@ def save_order(order_data):
             return save_order_local_fallback(order_data)
 
         print("✅ Firebase DB available, saving order...")
+        if ORDER_WRITE_BEHIND:
+            # Keep the order's own timestamp: a queued write may land later than it was placed
+            order_data.setdefault("createdAt", datetime.now(timezone.utc))
+            order_id = order_queue.submit(db, order_data)
+            if order_id:
+                print(f"✅ Order queued with ID: {order_id}")
+                return order_id
+
         ref = db.collection("orders").document()
         order_data["createdAt"] = firestore.SERVER_TIMESTAMP
-        ref.set(order_data)
+        ref.set(with_sync_stamp(order_data))
         print(f"✅ Order saved with ID: {ref.id}")
         return ref.id
 
@@ -101,27 +402,20 @@ def save_order(order_data):
 def save_order_local_fallback(order_data):
     """Fallback to save orders locally when Firebase is not available"""
     try:
-        import json
-        from datetime import datetime
-        
-        # Create local orders directory if it doesn't exist
-        os.makedirs("local_orders", exist_ok=True)
-        
         # Generate local order ID
         import uuid
         local_order_id = f"local_{uuid.uuid4().hex[:8]}"
         
         # Add local metadata
+        stamp_order_time(order_data)
         order_data["localOrderId"] = local_order_id
         order_data["savedLocally"] = True
         order_data["savedAt"] = datetime.now(timezone.utc).isoformat()
         
-        # Save to local file
-        filename = f"local_orders/order_{local_order_id}.json"
-        with open(filename, 'w') as f:
-            json.dump(order_data, f, indent=2, default=str)
+        # Append to the local order log
+        order_log.append(local_order_id, order_data)
         
-        print(f"✅ Order saved locally: {filename}")
+        print(f"✅ Order saved locally: {local_order_id}")
         return local_order_id
         
     except Exception as e:
@@ -160,46 +454,22 @@ def get_all_orders():
     return get_all_orders_local_fallback()
 
 
-def get_all_orders_local_fallback():
-    """Read orders from local files when Firebase is not available"""
+def _with_created_ms(orders):
+    """Stamp createdAtMs on legacy local records that predate it (newer ones pass through)"""
+    for order_data in orders:
+        if 'createdAtMs' not in order_data:
+            created_ms = order_created_ms(order_data)
+            if created_ms:
+                order_data['createdAtMs'] = created_ms
+    return orders
+
+
+def get_all_orders_local_fallback(limit=100):
+    """Read the latest orders from the local order log when Firebase is not available"""
     try:
-        import json
-        import os
-        from datetime import datetime
+        orders = _with_created_ms(order_log.latest(limit))
         
-        orders = []
-        local_orders_dir = "local_orders"
-        
-        if not os.path.exists(local_orders_dir):
-            print("📁 No local orders directory found")
-            return []
-        
-        # Read all JSON files in local_orders directory
-        for filename in os.listdir(local_orders_dir):
-            if filename.endswith('.json'):
-                try:
-                    filepath = os.path.join(local_orders_dir, filename)
-                    with open(filepath, 'r') as f:
-                        order_data = json.load(f)
-                        
-                    # Ensure the order has proper structure
-                    if 'orderId' in order_data or 'localOrderId' in order_data:
-                        # Convert local timestamp back to datetime for consistency
-                        if 'savedAt' in order_data:
-                            try:
-                                order_data['createdAt'] = datetime.fromisoformat(order_data['savedAt'])
-                            except:
-                                pass
-                        
-                        orders.append(order_data)
-                        
-                except Exception as e:
-                    print(f"❌ Error reading {filename}: {e}")
-        
-        # Sort by creation time (newest first)
-        orders.sort(key=lambda x: x.get('savedAt', ''), reverse=True)
-        
-        print(f"✅ Retrieved {len(orders)} orders from local files")
+        print(f"✅ Retrieved {len(orders)} orders from local order log")
         return orders
         
     except Exception as e:
@@ -207,22 +477,427 @@ def get_all_orders_local_fallback():
         return []
 
 
-def update_order_status(order_id, status):
+def get_orders_for_days(start_day, end_day, fallback=True):
+    """Orders whose createdDay falls in [start_day, end_day], newest first
+
+    fallback=False lets a Firestore read error propagate instead of quietly
+    answering from the local log (for callers that must not mistake a failed
+    read for an empty day).
+    """
     try:
         db = get_db()
-        if not db:
-            return False
+        if db:
+            docs = (
+                db.collection("orders")
+                .where("createdDay", ">=", start_day)
+                .where("createdDay", "<=", end_day)
+                .get()
+            )
+
+            orders = []
+            for doc in docs:
+                data = doc.to_dict()
+                data["id"] = doc.id
+                orders.append(data)
+
+            # Single-field range query needs no composite index; order in memory
+            orders.sort(key=order_created_ms, reverse=True)
+            print(f"✅ Retrieved {len(orders)} orders for {start_day}..{end_day} from Firebase")
+            return orders
+        else:
+            print("🔄 Firebase not available, using local orders")
+
+    except Exception as e:
+        print(f"❌ Firebase get_orders_for_days failed: {e}")
+        if not fallback:
+            raise
+        print("🔄 Using local orders fallback")
+
+    return get_orders_for_days_local_fallback(start_day, end_day)
+
+
+def iter_orders_for_days(start_day, end_day):
+    """Stream orders whose createdDay falls in [start_day, end_day], oldest day first
+
+    Firestore documents are pulled lazily from the query cursor and local
+    orders a chunk at a time, so callers can walk any range in flat memory.
+    The local log is only used if Firebase fails before the first order.
+    """
+    yielded = False
+    try:
+        db = get_db()
+        if db:
+            docs = (
+                db.collection("orders")
+                .where("createdDay", ">=", start_day)
+                .where("createdDay", "<=", end_day)
+                .order_by("createdDay")
+                .stream()
+            )
+            for doc in docs:
+                data = doc.to_dict()
+                data["id"] = doc.id
+                yielded = True
+                yield data
+            return
+        else:
+            print("🔄 Firebase not available, using local orders")
+
+    except Exception as e:
+        if yielded:
+            raise
+        print(f"❌ Firebase iter_orders_for_days failed: {e}")
+        print("🔄 Using local orders fallback")
+
+    for order_data in order_log.iter_days(start_day, end_day):
+        yield _with_created_ms([order_data])[0]
 
-        db.collection("orders").document(order_id).update({
-            "orderStatus": status,
-            "updatedAt": firestore.SERVER_TIMESTAMP
+
+def get_orders_for_day(day):
+    return get_orders_for_days(day, day)
+
+
+def get_orders_for_days_local_fallback(start_day, end_day):
+    """Read one or more day partitions of the local order log"""
+    try:
+        orders = _with_created_ms(order_log.for_days(start_day, end_day))
+
+        print(f"✅ Retrieved {len(orders)} orders for {start_day}..{end_day} from local order log")
+        return orders
+
+    except Exception as e:
+        print(f"❌ Local orders fallback failed: {e}")
+        return []
+
+
+def backfill_order_days(batch_size=400):
+    """One-off: stamp createdAtMs and createdDay on Firestore orders written before they existed"""
+    db = get_db()
+    if not db:
+        return 0
+
+    updated = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection("orders").stream():
+        data = doc.to_dict()
+        if (data.get("createdDay") and data.get("createdAtMs")) or not data.get("createdAt"):
+            continue
+        created_ms = order_created_ms(data)
+        batch.update(doc.reference, {
+            "createdAtMs": created_ms,
+            "createdDay": data.get("createdDay") or order_day_key(
+                datetime.fromtimestamp(created_ms / 1000, tz=timezone.utc)
+            )
         })
-        return True
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            updated += pending
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+        updated += pending
+
+    print(f"✅ Backfilled createdAtMs/createdDay on {updated} orders")
+    return updated
+
+
+# ---------------- DELTA SYNC ----------------
+def epoch_ms(value):
+    """Milliseconds since epoch for a datetime/Timestamp/ISO string, or None"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    if hasattr(value, "seconds"):
+        return value.seconds * 1000 + getattr(value, "nanos", 0) // 1_000_000
+    return None
+
+
+def order_change_ms(order):
+    """When an order last changed: its commit-time sync stamp, else updatedAt, else its creation time"""
+    for field in (ORDER_SYNC_FIELD, "updatedAt", "createdAt", "savedAt"):
+        ms = epoch_ms(order.get(field))
+        if ms is not None:
+            return ms
+    return 0
+
+
+def order_created_ms(order):
+    """When an order was placed, in epoch ms (0 if unknown)"""
+    created_ms = order.get("createdAtMs")
+    if created_ms:
+        return created_ms
+    # Orders written before createdAtMs existed
+    return epoch_ms(order.get("createdAt")) or epoch_ms(order.get("savedAt")) or 0
+
+
+def order_business_day(order):
+    """Business day an order belongs to; derived from its creation time when createdDay is missing"""
+    if order.get("createdDay"):
+        return order["createdDay"]
+    created_ms = order_created_ms(order)
+    if not created_ms:
+        return ""
+    return order_day_key(datetime.fromtimestamp(created_ms / 1000, tz=timezone.utc))
+
+
+def order_ref_id(order):
+    """Firestore id, or the local id of an order saved offline"""
+    return order.get("id") or order.get("localOrderId") or order.get("orderId") or ""
+
+
+def encode_order_cursor(change_ms, order_id):
+    return f"{change_ms}:{order_id}"
+
+
+def decode_order_cursor(cursor):
+    """(change_ms, order_id) from a cursor string; ValueError if malformed"""
+    change_ms, sep, order_id = cursor.partition(":")
+    if not sep:
+        raise ValueError("cursor must look like <updatedAt ms>:<order id>")
+    return int(change_ms), order_id
+
+
+def next_order_cursor(orders, previous=None):
+    """Cursor at the newest change in orders, never behind the previous cursor"""
+    if not orders:
+        return previous
+    newest = max((order_change_ms(o), order_ref_id(o)) for o in orders)
+    if previous:
+        try:
+            newest = max(newest, decode_order_cursor(previous))
+        except ValueError:
+            pass
+    return encode_order_cursor(*newest)
+
+
+def get_orders_changed_since(since_ms, since_id="", day=None, limit=500):
+    """Orders created or changed after the (change ms, id) cursor, oldest change first
+
+    Firestore orders are matched on their sync stamp, which Firestore sets
+    when the write commits, so a write-behind batch that lands late still
+    sorts after every cursor handed out before it was visible. Orders
+    written before the stamp existed only show up here once they change.
+    """
+    orders = None
+    try:
+        db = get_db()
+        if db:
+            since = datetime.fromtimestamp(since_ms / 1000, tz=timezone.utc)
+            docs = (
+                db.collection("orders")
+                .where(ORDER_SYNC_FIELD, ">=", since)
+                .order_by(ORDER_SYNC_FIELD)
+                .limit(limit)
+                .get()
+            )
+
+            orders = []
+            for doc in docs:
+                data = doc.to_dict()
+                data["id"] = doc.id
+                orders.append(data)
+        else:
+            print("🔄 Firebase not available, using local orders")
+
+    except Exception as e:
+        print(f"❌ Firebase get_orders_changed_since failed: {e}")
+        print("🔄 Using local orders fallback")
+
+    if orders is None:
+        try:
+            orders = order_log.changed_since(since_ms)
+        except Exception as e:
+            print(f"❌ Local orders fallback failed: {e}")
+            return []
+
+    cursor = (since_ms, since_id)
+    changed = [
+        o for o in orders
+        if (order_change_ms(o), order_ref_id(o)) > cursor
+        and (day is None or o.get("createdDay") == day)
+    ]
+    changed.sort(key=lambda o: (order_change_ms(o), order_ref_id(o)))
+    return changed
+
+
+# ---------------- PAGINATION ----------------
+ORDER_PAGE_MAX = 500
+
+
+def page_cursor(order):
+    """Keyset cursor "<createdAt ms>:<id>" pointing at order"""
+    return encode_order_cursor(order_created_ms(order), order_ref_id(order))
+
+
+def get_orders_page(cursor=None, limit=100):
+    """(orders, next_cursor): up to limit orders older than cursor, newest first
+
+    next_cursor is None on the last page. Pages are keyed on (createdAt, id)
+    rather than offsets, so each one costs the same however deep it is and
+    orders placed meanwhile don't shift later pages.
+    """
+    limit = max(1, min(int(limit), ORDER_PAGE_MAX))
+    created_ms, order_id = decode_order_cursor(cursor) if cursor else (None, None)
+
+    orders = None
+    try:
+        db = get_db()
+        if db:
+            orders = _get_orders_page_firestore(db, created_ms, order_id, limit)
+        else:
+            print("🔄 Firebase not available, using local orders")
 
     except Exception as e:
-        print(f"❌ update_order_status failed: {e}")
+        print(f"❌ Firebase get_orders_page failed: {e}")
+        print("🔄 Using local orders fallback")
+
+    if orders is None:
+        try:
+            orders = _with_created_ms(order_log.page(order_id, limit))
+        except Exception as e:
+            print(f"❌ Local orders fallback failed: {e}")
+            return [], None
+
+    next_cursor = page_cursor(orders[-1]) if len(orders) == limit else None
+    return orders, next_cursor
+
+
+def _get_orders_page_firestore(db, created_ms, order_id, limit):
+    query = db.collection("orders").order_by("createdAt", direction=firestore.Query.DESCENDING)
+
+    if order_id:
+        last = db.collection("orders").document(order_id).get()
+        if last.exists:
+            # Snapshot cursors also break createdAt ties on the document id
+            query = query.start_after(last)
+        else:
+            since = datetime.fromtimestamp(created_ms / 1000, tz=timezone.utc)
+            query = query.where("createdAt", "<", since)
+
+    orders = []
+    for doc in query.limit(limit).stream():
+        data = doc.to_dict()
+        data["id"] = doc.id
+        orders.append(data)
+    return orders
+
+
+def iter_orders(cursor=None, page_size=200):
+    """Every order older than cursor, newest first, fetched one page at a time"""
+    while True:
+        orders, cursor = get_orders_page(cursor, page_size)
+        yield from orders
+        if cursor is None:
+            return
+
+
+def get_order(order_id):
+    """Single order from Firestore or the local order log, or None"""
+    try:
+        if str(order_id).startswith("local_"):
+            return order_log.get(order_id)
+
+        queued = order_queue.get(order_id)
+        if queued is not None:
+            # Accepted but still in the write-behind queue
+            queued["id"] = order_id
+            return queued
+
+        db = get_db()
+        if not db:
+            return None
+
+        doc = db.collection("orders").document(order_id).get()
+        if not doc.exists:
+            return None
+
+        data = doc.to_dict()
+        data["id"] = doc.id
+        return data
+
+    except Exception as e:
+        print(f"❌ get_order failed: {e}")
+        return None
+
+
+def update_order(order_id, changes):
+    """Apply field changes to an order and notify live dashboards"""
+    changes = {"updatedAt": datetime.now(timezone.utc), **changes}  # delta sync and ETags key off it
+    try:
+        if str(order_id).startswith("local_"):
+            if not order_log.patch(order_id, changes):
+                return False
+        else:
+            db = get_db()
+            if not db:
+                return False
+            ensure_order_committed(order_id)
+            for attempt in range(ORDER_NOT_FOUND_RETRIES):
+                try:
+                    db.collection("orders").document(order_id).update(with_sync_stamp(changes))
+                    break
+                except NotFound:
+                    if attempt == ORDER_NOT_FOUND_RETRIES - 1:
+                        raise
+                    # Possibly queued by another worker whose writer hasn't flushed yet
+                    time.sleep(order_queue.flush_interval * 2)
+
+    except Exception as e:
+        print(f"❌ update_order failed: {e}")
         return False
 
+    publish_order_updated(order_id, changes)
+    return True
+
+
+def update_order_status(order_id, status):
+    return update_order(order_id, {
+        "orderStatus": status,
+        "updatedAt": datetime.now(timezone.utc)
+    })
+
+
+# ---------------- SALES STATS ----------------
+sales_stats = SalesStats(get_db)
+
+
+def record_order_sale(order_id, catalog=None, order=None):
+    """Fold a newly paid order into its day's aggregates; safe to call more than once"""
+    try:
+        order = order or get_order(order_id)
+        if not order:
+            return False
+        day = _local_order_day(order) or order_day_key()
+        ensure_order_committed(order_id)  # the Firestore path flags the stored order
+        recorded = sales_stats.record(order_id, order, day, catalog)
+        if recorded:
+            print(f"📈 Sales stats updated for {day} ({order_id})")
+        return recorded
+    except Exception as e:
+        print(f"❌ record_order_sale failed: {e}")
+        return False
+
+
+def get_sales_stats(start_day, end_day):
+    """Daily aggregates for [start_day, end_day], oldest first"""
+    try:
+        return sales_stats.for_days(start_day, end_day)
+    except Exception as e:
+        print(f"❌ get_sales_stats failed: {e}")
+        return []
+
 
 # ---------------- ADMIN TOKENS ----------------
 def get_all_admin_tokens():
@@ -257,3 +932,23 @@ def send_push_to_admins(title, body):
     except Exception as e:
         print(f"❌ Push failed: {e}")
         return False
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Firestore maintenance tasks")
+    parser.add_argument("task", choices=["backfill-order-days"],
+                        help="backfill-order-days: stamp createdAtMs/createdDay on older orders")
+    parser.add_argument("--batch-size", type=int, default=400, help="writes per batch commit (max 500)")
+    args = parser.parse_args(argv)
+
+    if not get_db():
+        print("❌ Firebase is not configured, nothing to backfill")
+        return 1
+
+    backfill_order_days(batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# "live" calls the gateway API; "simulation" keeps the built-in mock responses
+PAYMENT_GATEWAY_MODE = os.getenv("PAYMENT_GATEWAY_MODE", "simulation").lower()
+GATEWAY_BASE_URL = os.getenv("GATEWAY_BASE_URL", "https://api.razorpay.com/v1")
+GATEWAY_POOL_SIZE = int(os.getenv("GATEWAY_POOL_SIZE", "10"))  # keep-alive connections per worker
+GATEWAY_CONNECT_RETRIES = int(os.getenv("GATEWAY_CONNECT_RETRIES", "2"))
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "3.05"))  # seconds
+
+
+def _endpoint_timeout(name, read_default):
+    return (
+        float(os.getenv(f"GATEWAY_{name}_CONNECT_TIMEOUT", GATEWAY_CONNECT_TIMEOUT)),
+        float(os.getenv(f"GATEWAY_{name}_TIMEOUT", read_default))
+    )
+
+
+# (connect, read) timeouts per endpoint, in seconds; status checks are polled so they fail fastest
+GATEWAY_TIMEOUTS = {
+    "create_order": _endpoint_timeout("CREATE_ORDER", "10"),
+    "capture_payment": _endpoint_timeout("CAPTURE", "15"),
+    "payment_status": _endpoint_timeout("STATUS", "5")
+}
+GATEWAY_DEFAULT_READ_TIMEOUT = 10.0
+
+
+class GatewayError(Exception):
+    """Gateway API call that failed or answered with an error"""
+
+    def __init__(self, message, status_code=None, code=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+class GatewayClient:
+    """HTTP client for the payment gateway API with one pooled keep-alive session
+
+    Every call in a worker process goes through the same requests.Session,
+    so after the first request the TLS connection is reused instead of
+    handshaking again. Only connection failures are retried (nothing reached
+    the gateway yet); a timed-out read is never replayed, since creating an
+    order or capturing a payment twice is worse than reporting an error.
+    """
+
+    def __init__(self, api_key, api_secret, base_url=GATEWAY_BASE_URL, mode=PAYMENT_GATEWAY_MODE,
+                 pool_size=GATEWAY_POOL_SIZE, connect_timeout=GATEWAY_CONNECT_TIMEOUT):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.mode = mode
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._stats = {}  # endpoint -> {"calls", "errors", "totalMs", "maxMs"}
+
+    @property
+    def live(self):
+        return self.mode == "live"
+
+    # ---------------- SESSION ----------------
+    def _get_session(self):
+        # A forked worker must not share the parent's sockets
+        pid = os.getpid()
+        if self._session is not None and self._pid == pid:
+            return self._session
+
+        with self._lock:
+            if self._session is None or self._pid != pid:
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=Retry(total=GATEWAY_CONNECT_RETRIES, connect=GATEWAY_CONNECT_RETRIES,
+                                      read=0, status=0, other=0, backoff_factor=0.2)
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.auth = (self.api_key, self.api_secret)
+                session.headers.update({"Connection": "keep-alive", "Accept": "application/json"})
+
+                self._session, self._adapter, self._pid = session, adapter, pid
+                print(f"🔌 Gateway session opened ({self.base_url}, pool {self.pool_size})")
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = self._adapter = self._pid = None
+
+    # ---------------- CALLS ----------------
+    def request(self, endpoint, method, path, **kwargs):
+        """JSON body of a gateway API call; raises GatewayError on failure"""
+        session = self._get_session()
+        timeout = GATEWAY_TIMEOUTS.get(endpoint, (self.connect_timeout, GATEWAY_DEFAULT_READ_TIMEOUT))
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+            if response.status_code >= 400:
+                raise self._api_error(response)
+            body = response.json()
+            failed = False
+            return body
+        except requests.Timeout as e:
+            raise GatewayError(f"Gateway timed out ({endpoint})") from e
+        except requests.RequestException as e:
+            raise GatewayError(f"Gateway unreachable ({endpoint}): {e}") from e
+        except ValueError as e:
+            raise GatewayError(f"Gateway sent invalid JSON ({endpoint})") from e
+        finally:
+            self._record(endpoint, (time.perf_counter() - started) * 1000, failed)
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request(endpoint, "GET", path, **kwargs)
+
+    def post(self, endpoint, path, **kwargs):
+        return self.request(endpoint, "POST", path, **kwargs)
+
+    @staticmethod
+    def _api_error(response):
+        try:
+            error = response.json().get("error") or {}
+        except ValueError:
+            error = {}
+        return GatewayError(
+            error.get("description") or f"Gateway error {response.status_code}",
+            status_code=response.status_code,
+            code=error.get("code")
+        )
+
+    # ---------------- METRICS ----------------
+    def _record(self, endpoint, elapsed_ms, failed):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"calls": 0, "errors": 0, "totalMs": 0.0, "maxMs": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["totalMs"] += elapsed_ms
+            stats["maxMs"] = max(stats["maxMs"], elapsed_ms)
+
+    def metrics(self):
+        """Per-endpoint latency and connection reuse for this worker process"""
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avgMs": round(stats["totalMs"] / stats["calls"], 1) if stats["calls"] else 0.0,
+                    "maxMs": round(stats["maxMs"], 1)
+                }
+                for endpoint, stats in self._stats.items()
+            }
+
+            pools = []
+            if self._adapter is not None:
+                manager = self._adapter.poolmanager
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    pools.append({
+                        "host": pool.host,
+                        "connectionsOpened": pool.num_connections,
+                        "requests": pool.num_requests,
+                        # Requests that rode an already-open (keep-alive) connection
+                        "reused": max(pool.num_requests - pool.num_connections, 0),
+                        "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                        "maxSize": self.pool_size
+                    })
+
+        return {"mode": self.mode, "endpoints": endpoints, "pools": pools}
@@ -0,0 +1,11 @@
+import os
+
+# Dashboard SSE streams hold a thread each for up to SSE_MAX_STREAM_SECONDS, so use
+# threaded workers: a sync worker would be pinned by a single open dashboard
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
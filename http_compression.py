@@ -0,0 +1,50 @@
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))  # 1 = fastest, 9 = smallest
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))  # 0-11
+COMPRESS_MIMETYPES = ("application/json",)
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding we can produce that the client accepts, or None"""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(request, response, min_bytes=COMPRESS_MIN_BYTES):
+    """Compress a buffered response body in place when it is worth it"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        body = brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,75 @@
+import threading
+
+
+def _name_key(name):
+    return " ".join(str(name or "").split()).lower()
+
+
+class MenuCatalog:
+    """Lookup tables built once per menu version and shared by all routes"""
+
+    def __init__(self, items, version):
+        self.version = version
+        self.items = items
+        self.by_id = {str(item["id"]): item for item in items}
+        self.by_name = {_name_key(item.get("name")): item for item in items}
+
+        by_category = {}
+        for item in items:
+            by_category.setdefault(item.get("category", "Others"), []).append(item)
+
+        # dicts keep insertion order, so this is the order categories first appear in the menu
+        self.category_order = tuple(by_category)
+        self.by_category = {
+            category: tuple(category_items)
+            for category, category_items in by_category.items()
+        }
+
+    def get(self, item_id):
+        """O(1) item lookup by menu id"""
+        return self.by_id.get(str(item_id))
+
+    def get_by_name(self, name):
+        """Item whose name matches, ignoring case and spacing"""
+        return self.by_name.get(_name_key(name))
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.by_id
+
+    def __len__(self):
+        return len(self.items)
+
+
+def line_item_id(line, catalog=None):
+    """Menu id of an order line item
+
+    Lines saved before orders carried item ids are matched to the menu by
+    name; unknown names get a stable "name:<name>" key so they still count
+    as one item each.
+    """
+    item_id = line.get("id")
+    if item_id is not None:
+        return str(item_id)
+    item = catalog.get_by_name(line.get("name")) if catalog is not None else None
+    if item is not None:
+        return str(item["id"])
+    return f"name:{_name_key(line.get('name'))}"
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(snapshot):
+    """Return the catalog for a menu snapshot, rebuilding only when the version changes"""
+    global _catalog
+
+    catalog = _catalog
+    if catalog is not None and catalog.version == snapshot.version:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != snapshot.version:
+            _catalog = MenuCatalog(snapshot.items, snapshot.version)
+            print(f"📚 Menu catalog built for version {snapshot.version}")
+        return _catalog
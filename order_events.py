@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+import secrets
+from collections import deque
+from datetime import datetime
+
+from runtime_env import long_lived_feature
+
+ORDER_EVENT_HISTORY = int(os.getenv("ORDER_EVENT_HISTORY", "500"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_STREAM_SECONDS = float(os.getenv("SSE_MAX_STREAM_SECONDS", "300"))  # then the browser reconnects
+ORDER_FEED_INTERVAL = float(os.getenv("ORDER_FEED_INTERVAL", "1"))  # seconds between change polls
+ORDER_FEED_LOOKBACK_MS = 5000  # worker vs Firestore clock skew; re-sent orders are plain upserts
+ORDER_EVENTS_SSE = long_lived_feature("ORDER_EVENTS_SSE")  # each open stream holds a worker thread
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class OrderEventBus:
+    """In-process fan-out of order changes to admin dashboard streams
+
+    Event ids are "<boot>:<seq>". The boot token changes whenever the worker
+    restarts, so a client reconnecting with an id from another process (or
+    one older than the replay buffer) is told to resync instead of silently
+    missing events.
+    """
+
+    def __init__(self, history=ORDER_EVENT_HISTORY):
+        self.boot = secrets.token_hex(4)
+        self._events = deque(maxlen=history)  # (seq, event_type, payload)
+        self._seq = 0
+        self._listeners = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event_type, order_id, data):
+        payload = json.dumps({"id": order_id, **data}, default=_json_default)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event_type, payload))
+            self._cond.notify_all()
+
+    def cursor(self):
+        with self._cond:
+            return self._seq
+
+    def listeners(self):
+        """Streams currently open in this process"""
+        with self._cond:
+            return self._listeners
+
+    def parse_last_event_id(self, last_event_id):
+        """Sequence to resume after, or None if the client has to resync"""
+        if not last_event_id:
+            return None
+        boot, _, seq = last_event_id.partition(":")
+        if boot != self.boot or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._cond:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq < oldest - 1:
+                return None  # fell out of the replay buffer
+        return seq
+
+    def wait_for_events(self, after_seq, timeout):
+        """Events newer than after_seq, blocking up to timeout seconds for the first one"""
+        with self._cond:
+            if self._seq <= after_seq:
+                self._cond.wait(timeout)
+            return [event for event in self._events if event[0] > after_seq]
+
+    def stream(self, last_event_id=None, heartbeat=SSE_HEARTBEAT_SECONDS, max_seconds=SSE_MAX_STREAM_SECONDS):
+        """Generator of Server-Sent Events text frames
+
+        Ends after max_seconds so no stream pins a worker thread forever; the
+        browser reconnects with Last-Event-ID and the replay buffer fills the gap.
+        """
+        yield "retry: 3000\n\n"
+
+        after_seq = self.parse_last_event_id(last_event_id)
+        if after_seq is None:
+            after_seq = self.cursor()
+            if last_event_id:
+                yield f"id: {self.boot}:{after_seq}\nevent: resync\ndata: {{}}\n\n"
+
+        with self._cond:
+            self._listeners += 1
+        try:
+            last_sent = time.monotonic()
+            deadline = last_sent + max_seconds
+            while time.monotonic() < deadline:
+                events = self.wait_for_events(after_seq, min(heartbeat, max(deadline - time.monotonic(), 0)))
+                for seq, event_type, payload in events:
+                    yield f"id: {self.boot}:{seq}\nevent: {event_type}\ndata: {payload}\n\n"
+                    after_seq = seq
+                    last_sent = time.monotonic()
+
+                if time.monotonic() - last_sent >= heartbeat:
+                    yield ": heartbeat\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            with self._cond:
+                self._listeners -= 1
+
+
+class OrderChangeFeed:
+    """Publishes order changes committed by any worker onto this worker's event bus
+
+    The bus only sees writes made in its own process, and gunicorn runs
+    several workers. While at least one stream is open here, this polls the
+    shared order store through the delta-sync query (Firestore's commit-time
+    stamp, or the local order log) and publishes each changed order as an
+    "order_changed" event carrying the whole order.
+    """
+
+    def __init__(self, bus, interval=ORDER_FEED_INTERVAL):
+        self.bus = bus
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_running(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="order-feed", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # firebase_config publishes through this module, so import it late
+        from firebase_config import get_orders_changed_since, decode_order_cursor, next_order_cursor, order_ref_id
+
+        cursor = None
+        while True:
+            time.sleep(self.interval)
+            if not self.bus.listeners():
+                cursor = None  # nobody watching: don't poll, start fresh next time
+                continue
+            if cursor is None:
+                cursor = f"{int(time.time() * 1000) - ORDER_FEED_LOOKBACK_MS}:"
+
+            try:
+                orders = get_orders_changed_since(*decode_order_cursor(cursor))
+            except Exception as e:
+                print(f"❌ Order change feed failed: {e}")
+                continue
+            for order in orders:
+                self.bus.publish("order_changed", order_ref_id(order), order)
+            cursor = next_order_cursor(orders, cursor)
+
+
+# Global order event bus instance
+order_events = OrderEventBus()
+
+# Global order change feed instance
+order_feed = OrderChangeFeed(order_events)
+
+
+def publish_order_created(order_id, order_data):
+    order_events.publish("order_created", order_id, order_data)
+
+
+def publish_order_updated(order_id, changes):
+    order_events.publish("order_updated", order_id, changes)
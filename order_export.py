@@ -0,0 +1,106 @@
+import io
+import csv
+import json
+from datetime import datetime, timezone
+
+from firebase_config import order_created_ms, order_business_day
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CHUNK_CHARS = 64 * 1024  # rows are buffered up to this size per response chunk
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# One row per line item; the order columns repeat on every line of the same order
+EXPORT_FIELDS = (
+    "order_id",
+    "order_code",
+    "created_at",
+    "business_day",
+    "customer_name",
+    "customer_email",
+    "payment_status",
+    "order_status",
+    "payment_method",
+    "gateway_payment_id",
+    "order_total",
+    "line_number",
+    "item_id",
+    "item_name",
+    "unit_price",
+    "quantity",
+    "line_total"
+)
+
+
+def export_rows(orders):
+    """Flatten orders into line-item rows (dicts keyed by EXPORT_FIELDS), lazily"""
+    for order in orders:
+        created_ms = order_created_ms(order)
+        header = {
+            "order_id": order.get("id") or order.get("localOrderId", ""),
+            "order_code": order.get("orderId", ""),
+            "created_at": datetime.fromtimestamp(created_ms / 1000, tz=timezone.utc).isoformat() if created_ms else "",
+            "business_day": order_business_day(order),
+            "customer_name": order.get("customerName", ""),
+            "customer_email": order.get("customerEmail", ""),
+            "payment_status": order.get("paymentStatus", ""),
+            "order_status": order.get("orderStatus", ""),
+            "payment_method": order.get("paymentMethod", ""),
+            "gateway_payment_id": order.get("gatewayPaymentId", ""),
+            "order_total": order.get("totalAmount", 0)
+        }
+
+        for line_number, line in enumerate(order.get("items") or [], start=1):
+            yield {
+                **header,
+                "line_number": line_number,
+                "item_id": line.get("id", ""),
+                "item_name": line.get("name", ""),
+                "unit_price": line.get("price", 0),
+                "quantity": line.get("quantity", 0),
+                "line_total": line.get("total", 0)
+            }
+
+
+def csv_safe(value):
+    """Neutralise spreadsheet formulas in text cells (customer names, item names...)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(orders):
+    """CSV text chunks: a header line, then one line per line item
+
+    Text from the order form is escaped with csv_safe, so opening the export
+    in a spreadsheet can't run a formula a customer typed in.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+
+    for row in export_rows(orders):
+        writer.writerow({field: csv_safe(value) for field, value in row.items()})
+        if buffer.tell() >= EXPORT_CHUNK_CHARS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def stream_ndjson(orders):
+    """NDJSON text chunks, one object per line item"""
+    lines = []
+    size = 0
+    for row in export_rows(orders):
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_CHARS:
+            yield "".join(lines)
+            lines = []
+            size = 0
+
+    if lines:
+        yield "".join(lines)
@@ -0,0 +1,452 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no cross-worker locking
+    fcntl = None
+
+ORDER_LOG_DIR = os.getenv("ORDER_LOG_DIR", "local_orders")
+ORDER_LOG_SEGMENT_BYTES = int(os.getenv("ORDER_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+ORDER_LOG_FSYNC_EVERY = int(os.getenv("ORDER_LOG_FSYNC_EVERY", "16"))  # records
+ORDER_LOG_FSYNC_INTERVAL = float(os.getenv("ORDER_LOG_FSYNC_INTERVAL", "1.0"))  # seconds
+
+INDEX_FILE = "index.ndjson"
+LOCK_FILE = ".lock"
+INDEX_VERSION = 3  # bump whenever the row layout or day key changes; the index is rebuilt
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class OrderLog:
+    """Append-only NDJSON order log split into size-rotated segments
+
+    Each segment line is {"op": "put"|"patch", "id": ..., "ts": ..., "data": {...}};
+    a patch carries only the fields that changed and ts is the write time in
+    epoch ms. The sidecar index holds one [segment, offset, length, day,
+    order_id, op, ts] row per record, so "today", "latest N" or "changed
+    since" reads seek straight to the bytes they need. Several
+    workers may share the directory: appends take an exclusive file lock,
+    and each worker tails the index to pick up the others' writes.
+    """
+
+    def __init__(self, directory=ORDER_LOG_DIR, segment_bytes=ORDER_LOG_SEGMENT_BYTES,
+                 fsync_every=ORDER_LOG_FSYNC_EVERY, fsync_interval=ORDER_LOG_FSYNC_INTERVAL,
+                 day_of=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.day_of = day_of or (lambda data: str(data.get("savedAt", ""))[:10])
+
+        self._lock = threading.RLock()
+        self._opened = False
+        self._entries_by_id = {}  # order_id -> [(segment, offset, length, op)]
+        self._ids_by_day = {}  # day -> [order_id] in write order
+        self._day_by_id = {}
+        self._order_ids = []  # every order id in write order
+        self._position_by_id = {}  # order_id -> index into _order_ids
+        self._changes = []  # (ts, order_id) per record in write order
+        self._index_pos = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._dirty_files = set()
+
+    # ---------------- PUBLIC ----------------
+    def append(self, order_id, order):
+        """Store a new order"""
+        return self._write("put", order_id, order, self.day_of(order))
+
+    def patch(self, order_id, fields):
+        """Record changed fields for an existing order; False if the order is unknown"""
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            day = self._day_by_id.get(order_id)
+            if day is None:
+                return False
+            self._write("patch", order_id, fields, day)
+            return True
+
+    def get(self, order_id):
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            orders = self._read_orders([order_id])
+        return orders[0] if orders else None
+
+    def latest(self, limit=100):
+        """Most recent orders first"""
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            ids = self._order_ids[-limit:] if limit else list(self._order_ids)
+            return self._read_orders(reversed(ids))
+
+    def page(self, before_id=None, limit=100):
+        """Up to limit orders written before before_id (or the newest), most recent first
+
+        Keyset pagination over write order, which is creation order: the
+        cursor is an order id, so pages stay stable while new orders land.
+        """
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            end = len(self._order_ids)
+            if before_id is not None:
+                end = self._position_by_id.get(before_id)
+                if end is None:
+                    return []
+            ids = self._order_ids[max(end - limit, 0):end]
+            return self._read_orders(reversed(ids))
+
+    def for_day(self, day):
+        """All orders whose day key matches, most recent first"""
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            return self._read_orders(reversed(self._ids_by_day.get(day, [])))
+
+    def for_days(self, start_day, end_day):
+        """Orders from every day partition in [start_day, end_day], most recent first"""
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            days = sorted(day for day in self._ids_by_day if start_day <= day <= end_day)
+            ids = [order_id for day in days for order_id in self._ids_by_day[day]]
+            return self._read_orders(reversed(ids))
+
+    def iter_days(self, start_day, end_day, chunk=200):
+        """Yield orders from [start_day, end_day] oldest first, materialising chunk at a time"""
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            days = sorted(day for day in self._ids_by_day if start_day <= day <= end_day)
+            ids = [order_id for day in days for order_id in self._ids_by_day[day]]
+
+        for start in range(0, len(ids), chunk):
+            with self._lock:
+                orders = self._read_orders(ids[start:start + chunk])
+            yield from orders
+
+    def changed_since(self, since_ms, slack_ms=5000):
+        """Orders with a record written after since_ms, oldest change first
+
+        Walks the write-ordered change list backwards, so the cost follows the
+        number of recent changes. slack_ms absorbs clock skew between workers
+        appending to the same log; callers filter on their own cursor.
+        """
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            ids = []
+            seen = set()
+            for ts, order_id in reversed(self._changes):
+                if ts < since_ms - slack_ms:
+                    break
+                if order_id not in seen:
+                    seen.add(order_id)
+                    ids.append(order_id)
+            return self._read_orders(reversed(ids))
+
+    def count(self):
+        with self._lock:
+            self._open()
+            self._refresh_index()
+            return len(self._order_ids)
+
+    def sync(self):
+        """fsync everything written since the last sync"""
+        with self._lock:
+            for path in self._dirty_files:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError as e:
+                    print(f"⚠️ fsync failed for {path}: {e}")
+            self._dirty_files.clear()
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    # ---------------- WRITE PATH ----------------
+    def _write(self, op, order_id, data, day):
+        with self._lock:
+            self._open()
+            with self._file_lock():
+                self._refresh_index()
+                self._write_unlocked(op, order_id, data, day)
+
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self.sync()
+
+        return order_id
+
+    def _write_unlocked(self, op, order_id, data, day):
+        """Append one record; the caller holds the file lock"""
+        ts = int(time.time() * 1000)
+        line = (json.dumps({"op": op, "id": order_id, "ts": ts, "data": data}, default=_json_default) + "\n").encode("utf-8")
+        segment = self._active_segment(len(line))
+        path = self._segment_path(segment)
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+
+        row = [segment, offset, len(line), day, order_id, op, ts]
+        with open(self._index_path(), "ab") as f:
+            f.write((json.dumps(row) + "\n").encode("utf-8"))
+            self._index_pos = f.tell()
+        self._add_entry(row)
+        self._dirty_files.update((path, self._index_path()))
+
+    def _active_segment(self, incoming):
+        segments = self._segments()
+        if not segments:
+            return 1
+        current = segments[-1]
+        if os.path.getsize(self._segment_path(current)) + incoming > self.segment_bytes:
+            print(f"🔄 Rotating order log to segment {current + 1}")
+            return current + 1
+        return current
+
+    # ---------------- INDEX ----------------
+    def _add_entry(self, row):
+        segment, offset, length, day, order_id, op, ts = row
+        entries = self._entries_by_id.get(order_id)
+        if entries is None:
+            if op != "put":
+                return  # patch for an order we never saw
+            entries = self._entries_by_id[order_id] = []
+            self._position_by_id[order_id] = len(self._order_ids)
+            self._order_ids.append(order_id)
+            self._ids_by_day.setdefault(day, []).append(order_id)
+            self._day_by_id[order_id] = day
+        entries.append((segment, offset, length, op))
+        self._changes.append((ts, order_id))
+
+    def _refresh_index(self):
+        """Pick up index rows appended by other workers since our last read"""
+        path = self._index_path()
+        try:
+            if os.path.getsize(path) <= self._index_pos:
+                return
+        except OSError:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(self._index_pos)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # row still being written
+                self._index_pos += len(raw)
+                try:
+                    row = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(row, list):
+                    self._add_entry(row)
+
+    def _open(self):
+        if self._opened:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock():
+            if not self._index_is_current():
+                self._rebuild_index()
+            self._refresh_index()
+            self._recover_unindexed()
+            self._migrate_legacy_files()
+        self._opened = True
+        atexit.register(self.sync)
+
+    def _index_is_current(self):
+        try:
+            with open(self._index_path(), "rb") as f:
+                header = json.loads(f.readline() or b"null")
+        except (OSError, ValueError):
+            return False
+        return isinstance(header, dict) and header.get("version") == INDEX_VERSION
+
+    def _rebuild_index(self):
+        """Regenerate the sidecar index by scanning every segment"""
+        print("🔄 Rebuilding order log index")
+        self._entries_by_id.clear()
+        self._ids_by_day.clear()
+        self._day_by_id.clear()
+        self._order_ids.clear()
+        self._position_by_id.clear()
+        self._changes.clear()
+
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "wb") as index:
+            index.write((json.dumps({"version": INDEX_VERSION}) + "\n").encode("utf-8"))
+            for segment in self._segments():
+                for row in self._scan_segment(segment, 0):
+                    index.write((json.dumps(row) + "\n").encode("utf-8"))
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(tmp_path, self._index_path())
+
+        # Entries are already in memory; skip re-reading the file we just wrote
+        self._index_pos = os.path.getsize(self._index_path())
+
+    def _recover_unindexed(self):
+        """Index records that reached a segment but not the index (crash between the two writes)"""
+        indexed_end = {}
+        for entries in self._entries_by_id.values():
+            for segment, offset, length, _ in entries:
+                indexed_end[segment] = max(indexed_end.get(segment, 0), offset + length)
+
+        last_indexed = max(indexed_end) if indexed_end else 0
+        rows = []
+        for segment in self._segments():
+            if segment < last_indexed:
+                continue
+            rows.extend(self._scan_segment(segment, indexed_end.get(segment, 0)))
+
+        if rows:
+            with open(self._index_path(), "ab") as f:
+                for row in rows:
+                    f.write((json.dumps(row) + "\n").encode("utf-8"))
+                self._index_pos = f.tell()
+            print(f"🔄 Indexed {len(rows)} unindexed order log record(s)")
+
+    def _scan_segment(self, segment, start):
+        """Index the records in a segment from byte offset start, yielding their rows"""
+        path = self._segment_path(segment)
+        with open(path, "rb+") as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Torn write from a crash: cut it off so the next append starts clean
+                    f.truncate(offset)
+                    print(f"⚠️ Truncated partial record in {os.path.basename(path)}")
+                    break
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    offset += len(raw)
+                    continue
+
+                if record.get("op") == "put":
+                    day = self.day_of(record["data"])
+                else:
+                    day = self._day_by_id.get(record.get("id"), "")
+                row = [segment, offset, len(raw), day, record.get("id"), record.get("op"), record.get("ts", 0)]
+                self._add_entry(row)
+                yield row
+                offset += len(raw)
+
+    # ---------------- READ PATH ----------------
+    def _read_orders(self, order_ids):
+        """Materialise orders (put + patches applied) reading only their own bytes"""
+        handles = {}
+        orders = []
+        try:
+            for order_id in order_ids:
+                order = None
+                for segment, offset, length, op in self._entries_by_id.get(order_id, ()):
+                    f = handles.get(segment)
+                    if f is None:
+                        f = handles[segment] = open(self._segment_path(segment), "rb")
+                    f.seek(offset)
+                    record = json.loads(f.read(length))
+                    if op == "put":
+                        order = record["data"]
+                    elif order is not None:
+                        order.update(record["data"])
+                if order is not None:
+                    orders.append(order)
+        finally:
+            for f in handles.values():
+                f.close()
+        return orders
+
+    # ---------------- LEGACY ----------------
+    def _migrate_legacy_files(self):
+        """Move one-file-per-order JSON from the old fallback into the log"""
+        legacy = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("order_") and name.endswith(".json")
+        )
+        if not legacy:
+            return
+
+        legacy_dir = os.path.join(self.directory, "legacy")
+        os.makedirs(legacy_dir, exist_ok=True)
+
+        orders = []
+        for name in legacy:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    orders.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"❌ Error reading {name}: {e}")
+                continue
+
+        orders.sort(key=lambda o: o.get("savedAt", ""))
+        for order in orders:
+            order_id = order.get("localOrderId") or order.get("orderId")
+            if order_id and order_id not in self._entries_by_id:
+                self._write_unlocked("put", order_id, order, self.day_of(order))
+
+        for name in legacy:
+            shutil.move(os.path.join(self.directory, name), os.path.join(legacy_dir, name))
+        self.sync()
+        print(f"✅ Migrated {len(legacy)} legacy local order file(s) into the order log")
+
+    # ---------------- FILES ----------------
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name.endswith(".ndjson"):
+                try:
+                    segments.append(int(name[len("segment-"):-len(".ndjson")]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"segment-{segment:06d}.ndjson")
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _file_lock(self):
+        return _FileLock(os.path.join(self.directory, LOCK_FILE))
+
+
+class _FileLock:
+    """Exclusive flock on a lock file, shared by every worker using the log"""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+        self._f = None
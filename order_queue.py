@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, BadRequest
+
+ORDER_QUEUE_MAX = int(os.getenv("ORDER_QUEUE_MAX", "1000"))
+ORDER_BATCH_SIZE = min(int(os.getenv("ORDER_BATCH_SIZE", "100")), 500)  # Firestore batch limit is 500
+ORDER_FLUSH_INTERVAL = float(os.getenv("ORDER_FLUSH_INTERVAL", "0.5"))  # seconds
+ORDER_MAX_BACKOFF = 30  # seconds between retries while Firestore keeps failing
+ORDER_SPOOL_DIR = os.getenv("ORDER_SPOOL_DIR", "order_spool")
+ORDER_DEAD_LETTER = "dead-letter.ndjson"  # in the spool dir: orders Firestore will never accept
+
+# Errors a retry can't fix: Firestore rejecting the document (InvalidArgument and other
+# 400s) or the client failing to encode it
+PERMANENT_COMMIT_ERRORS = (BadRequest, TypeError, ValueError)
+
+# Stamped by Firestore when an order write commits; delta sync cursors key off it
+ORDER_SYNC_FIELD = "syncedAt"
+
+
+def with_sync_stamp(fields):
+    """Copy of an order write with the commit-time sync field added"""
+    return {**fields, ORDER_SYNC_FIELD: firestore.SERVER_TIMESTAMP}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+
+def _decode(obj):
+    if "$datetime" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class OrderWriteQueue:
+    """Write-behind queue: acknowledge orders immediately, commit them to Firestore in batches
+
+    Every accepted order is appended to a per-process spool file before it is
+    acknowledged, so a worker restart loses nothing: the next worker to start
+    claims spool files left by dead processes and replays them. Orders are
+    written with create(), so replaying a spool entry that was already
+    committed (and maybe confirmed or paid since) never overwrites it.
+    An order Firestore rejects outright is moved to a dead-letter file in
+    the spool dir instead of blocking every order queued behind it.
+    Until its batch commits, an order can be read with get() and waited
+    for with wait_committed().
+    """
+
+    def __init__(self, spool_dir=ORDER_SPOOL_DIR, max_pending=ORDER_QUEUE_MAX,
+                 batch_size=ORDER_BATCH_SIZE, flush_interval=ORDER_FLUSH_INTERVAL):
+        self.spool_dir = spool_dir
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._db = None
+        self._pending = deque()  # (order_id, order_data)
+        self._queued = {}  # order_id -> order_data, pending or in flight
+        self._cond = threading.Condition()
+        self._pid = None
+        self._thread = None
+        self._spool = None
+        self._spool_lines = 0
+        self._inflight = 0
+
+    # ---------------- PUBLIC ----------------
+    def start(self, db):
+        """Start the writer now and replay spools left by dead workers (call at app startup)"""
+        try:
+            self._ensure_started(db)
+            return True
+        except OSError as e:
+            print(f"❌ Order spool unavailable: {e}")
+            return False
+
+    def submit(self, db, order_data):
+        """Queue an order and return its Firestore id, or None if it could not be queued"""
+        try:
+            self._ensure_started(db)
+        except OSError as e:
+            print(f"❌ Order spool unavailable: {e}")
+            return None
+
+        ref = db.collection("orders").document()
+
+        with self._cond:
+            if len(self._pending) + self._inflight >= self.max_pending:
+                overloaded = True
+            else:
+                overloaded = False
+                self._spool_write(ref.id, order_data)
+                self._pending.append((ref.id, order_data))
+                self._queued[ref.id] = order_data
+                self._cond.notify()
+
+        if overloaded:
+            # Backpressure: the queue is full, so this caller pays for a direct write
+            print(f"⚠️ Order queue full ({self.max_pending}), writing {ref.id} synchronously")
+            ref.set(with_sync_stamp(order_data))
+
+        return ref.id
+
+    def flush(self, timeout=10):
+        """Block until everything queued so far is committed (or timeout)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def get(self, order_id):
+        """Copy of an order queued in this process and not committed yet, or None"""
+        with self._cond:
+            order_data = self._queued.get(order_id)
+            return dict(order_data) if order_data is not None else None
+
+    def wait_committed(self, order_id, timeout=10):
+        """Block until an order queued in this process is committed; True once it is in Firestore
+
+        Orders this process never queued count as committed.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while order_id in self._queued:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "inflight": self._inflight,
+                "max_pending": self.max_pending
+            }
+
+    # ---------------- WORKER ----------------
+    def _ensure_started(self, db):
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+
+        with self._cond:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+
+            # First use in this process (or after a fork): fresh state, own spool file
+            self._db = db
+            self._pid = pid
+            self._pending = deque()
+            self._queued = {}
+            self._inflight = 0
+            os.makedirs(self.spool_dir, exist_ok=True)
+            recovered = self._recover()
+            self._spool = open(self._spool_path(pid), "a", encoding="utf-8")
+            self._spool_lines = 0
+            for order_id, order_data in recovered:
+                self._spool_write(order_id, order_data)
+                self._pending.append((order_id, order_data))
+                self._queued[order_id] = order_data
+
+            self._thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush, 5)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(self.flush_interval)
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                self._inflight = len(batch)
+
+            if not batch:
+                continue
+
+            try:
+                self._commit(batch)
+                print(f"✅ Committed {len(batch)} queued order(s) to Firebase")
+                backoff = self.flush_interval
+            except Exception as e:
+                print(f"❌ Queued order commit failed, will retry: {e}")
+                with self._cond:
+                    self._pending.extendleft(reversed(batch))
+                    self._inflight = 0
+                time.sleep(backoff)
+                backoff = min(backoff * 2, ORDER_MAX_BACKOFF)
+                continue
+
+            with self._cond:
+                self._inflight = 0
+                for order_id, _ in batch:
+                    self._queued.pop(order_id, None)
+                self._compact_spool()
+                self._cond.notify_all()
+
+    def _commit(self, batch):
+        try:
+            write_batch = self._db.batch()
+            for order_id, order_data in batch:
+                write_batch.create(self._db.collection("orders").document(order_id), with_sync_stamp(order_data))
+            write_batch.commit()
+        except AlreadyExists:
+            # A replayed spool entry was committed before the crash: keep the stored order,
+            # which may have been confirmed or paid since, and write the rest one by one
+            self._commit_each(batch)
+        except PERMANENT_COMMIT_ERRORS as e:
+            print(f"⚠️ Queued batch rejected ({type(e).__name__}), committing orders one by one")
+            self._commit_each(batch)
+
+    def _commit_each(self, batch):
+        """Create orders one at a time; transient errors still raise so the batch is retried"""
+        for order_id, order_data in batch:
+            try:
+                self._db.collection("orders").document(order_id).create(with_sync_stamp(order_data))
+            except AlreadyExists:
+                print(f"↩️ Queued order {order_id} already in Firebase, skipped")
+            except PERMANENT_COMMIT_ERRORS as e:
+                self._dead_letter(order_id, order_data, e)
+
+    # ---------------- SPOOL ----------------
+    def _spool_path(self, pid):
+        return os.path.join(self.spool_dir, f"orders-{pid}.ndjson")
+
+    def _spool_write(self, order_id, order_data):
+        self._spool.write(json.dumps({"id": order_id, "order": order_data}, default=_encode) + "\n")
+        self._spool.flush()
+        self._spool_lines += 1
+
+    def _dead_letter(self, order_id, order_data, error):
+        entry = {"id": order_id, "order": order_data, "error": f"{type(error).__name__}: {error}",
+                 "failedAt": datetime.now().isoformat()}
+        try:
+            line = json.dumps(entry, default=_encode)
+        except TypeError:
+            # The order itself can't be encoded: keep what we can read of it
+            entry["order"] = repr(order_data)
+            line = json.dumps(entry)
+        with open(os.path.join(self.spool_dir, ORDER_DEAD_LETTER), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        print(f"☠️ Queued order {order_id} rejected by Firebase ({entry['error']}), moved to {ORDER_DEAD_LETTER}")
+
+    def _compact_spool(self):
+        """Drop committed entries from the spool (called with the lock held)"""
+        if self._pending:
+            if self._spool_lines <= 2 * self.max_pending:
+                return
+            tmp_path = self._spool_path(self._pid) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for order_id, order_data in self._pending:
+                    f.write(json.dumps({"id": order_id, "order": order_data}, default=_encode) + "\n")
+            self._spool.close()
+            os.replace(tmp_path, self._spool_path(self._pid))
+            self._spool = open(self._spool_path(self._pid), "a", encoding="utf-8")
+            self._spool_lines = len(self._pending)
+        else:
+            self._spool.truncate(0)
+            self._spool.seek(0)
+            self._spool_lines = 0
+
+    def _recover(self):
+        """Claim spool files left behind by dead workers and return their orders
+
+        A file carrying our own pid is stale too: this process has only just
+        started using the queue, so whatever is in it came from an earlier
+        worker that happened to have the same pid.
+        """
+        recovered = []
+        for name in os.listdir(self.spool_dir):
+            if not name.startswith("orders-") or not name.endswith(".ndjson"):
+                continue
+            try:
+                owner = int(name[len("orders-"):-len(".ndjson")])
+            except ValueError:
+                continue
+            if owner != self._pid and _pid_alive(owner):
+                continue
+
+            path = os.path.join(self.spool_dir, name)
+            claimed = f"{path}.claimed-{self._pid}"
+            try:
+                os.rename(path, claimed)  # atomic: only one worker wins the claim
+            except OSError:
+                continue
+
+            count = 0
+            with open(claimed, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line, object_hook=_decode)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-write
+                    recovered.append((entry["id"], entry["order"]))
+                    count += 1
+            os.remove(claimed)
+            print(f"🔄 Recovered {count} queued order(s) from {name}")
+        return recovered
+
+
+# Global order write queue instance
+order_queue = OrderWriteQueue()
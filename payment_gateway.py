@@ -1,31 +1,41 @@
 import hashlib
 import hmac
 import json
+import os
 import time
 import uuid
-import requests
 from datetime import datetime, timezone
 from flask import current_app
 import secrets
+from pricing import to_paise
+from gateway_client import GatewayClient, GATEWAY_BASE_URL
 
 class PaymentGateway:
     """Secure Payment Gateway Integration (Razorpay-style)"""
     
     def __init__(self):
-        self.api_key = "rzp_test_XXXXXXXXXXXXXXXX"  # Test key
-        self.api_secret = "test_secret_XXXXXXXXXXXXXXXX"  # Test secret
-        self.webhook_secret = "webhook_secret_XXXXXXXXXXXXXXXX"
-        self.base_url = "https://api.razorpay.com/v1"
+        self.api_key = os.getenv("RAZORPAY_KEY_ID", "rzp_test_XXXXXXXXXXXXXXXX")  # Test key
+        self.api_secret = os.getenv("RAZORPAY_KEY_SECRET", "test_secret_XXXXXXXXXXXXXXXX")  # Test secret
+        self.webhook_secret = os.getenv("RAZORPAY_WEBHOOK_SECRET", "webhook_secret_XXXXXXXXXXXXXXXX")
+        self.base_url = GATEWAY_BASE_URL
+        
+        # Pooled keep-alive HTTP client; PAYMENT_GATEWAY_MODE=live sends real API calls
+        self.client = GatewayClient(self.api_key, self.api_secret, self.base_url)
+        if self.client.live and "XXXX" in self.api_key:
+            print("⚠️ PAYMENT_GATEWAY_MODE=live but RAZORPAY_KEY_ID is not set")
         
     def generate_order_id(self):
         """Generate secure order ID"""
         return f"order_{int(time.time())}_{secrets.token_hex(4)}"
     
-    def create_order(self, amount, currency="INR", receipt=None):
+    def create_order(self, amount, currency="INR", receipt=None, amount_paise=None):
         """Create payment order with secure parameters"""
         try:
+            if amount_paise is None:
+                amount_paise = to_paise(amount)
+
             order_data = {
-                "amount": int(amount * 100),  # Convert to paise
+                "amount": amount_paise,
                 "currency": currency,
                 "receipt": receipt or self.generate_order_id(),
                 "payment_capture": 1,
@@ -34,10 +44,12 @@ class PaymentGateway:
                 }
             }
             
-            # In production, make actual API call
-            # response = requests.post(f"{self.base_url}/orders", 
-            #                        auth=(self.api_key, self.api_secret),
-            #                        json=order_data)
+            if self.client.live:
+                return {
+                    "success": True,
+                    "order": self.client.post("create_order", "/orders", json=order_data),
+                    "razorpay_key": self.api_key
+                }
             
             # For simulation, return mock response
             mock_order = {
@@ -84,19 +96,28 @@ class PaymentGateway:
             current_app.logger.error(f"Signature verification error: {e}")
             return False
     
-    def capture_payment(self, razorpay_payment_id, amount):
+    def capture_payment(self, razorpay_payment_id, amount, amount_paise=None):
         """Capture payment after verification"""
         try:
-            # In production, make actual API call
-            # response = requests.post(f"{self.base_url}/payments/{razorpay_payment_id}/capture",
-            #                        auth=(self.api_key, self.api_secret),
-            #                        json={"amount": int(amount * 100)})
+            if amount_paise is None:
+                amount_paise = to_paise(amount)
+
+            if self.client.live:
+                payment = self.client.post(
+                    "capture_payment",
+                    f"/payments/{razorpay_payment_id}/capture",
+                    json={"amount": amount_paise, "currency": "INR"}
+                )
+                return {
+                    "success": True,
+                    "payment": payment
+                }
             
             # For simulation, return mock response
             mock_payment = {
                 "id": razorpay_payment_id,
                 "entity": "payment",
-                "amount": int(amount * 100),
+                "amount": amount_paise,
                 "currency": "INR",
                 "status": "captured",
                 "captured": True,
@@ -118,25 +139,25 @@ class PaymentGateway:
     def get_payment_status(self, payment_id):
         """Get payment status from gateway"""
         try:
-            # In production, make actual API call
-            # response = requests.get(f"{self.base_url}/payments/{payment_id}",
-            #                        auth=(self.api_key, self.api_secret))
+            if self.client.live:
+                payment = self.client.get("payment_status", f"/payments/{payment_id}")
+                return {
+                    "success": True,
+                    "status": payment.get("status", "unknown"),
+                    "payment": payment
+                }
             
             # For simulation, check our database
-            from firebase_config import get_db
-            db = get_db()
+            from transaction_manager import transaction_manager
             
-            # Look up transaction by payment ID
-            transactions = db.collection("transactions")\
-                              .where("payment_id", "==", payment_id)\
-                              .limit(1)\
-                              .get()
+            # Look up transaction by gateway payment ID (point read through the lookup index)
+            transaction = transaction_manager.get_transaction_by_gateway_payment_id(payment_id)
             
-            for doc in transactions:
+            if transaction:
                 return {
                     "success": True,
-                    "status": doc.to_dict().get("status", "unknown"),
-                    "payment": doc.to_dict()
+                    "status": transaction.get("status", "unknown"),
+                    "payment": transaction
                 }
             
             return {
@@ -1,7 +1,9 @@
 from functools import wraps
 from flask import request, jsonify, redirect, session, current_app
 from transaction_manager import TransactionManager
+import json
 import time
+from datetime import datetime, timezone
 
 def require_payment_verified(f):
     """Middleware to require payment verification before accessing protected routes"""
@@ -240,7 +242,7 @@ def log_payment_activity(activity_type):
                 "duration": duration,
                 "ip_address": request.remote_addr,
                 "user_agent": request.headers.get("User-Agent"),
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
                 "endpoint": request.endpoint,
                 "method": request.method
             }
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+
+QUOTE_CACHE_SIZE = 512
+
+
+def to_paise(rupees):
+    """Convert a rupee amount (int, float or str) to integer paise"""
+    return int((Decimal(str(rupees)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    """Convert integer paise back to rupees, keeping whole amounts as int"""
+    if paise % 100 == 0:
+        return paise // 100
+    return paise / 100
+
+
+class CartQuote:
+    """A priced cart: line items and totals computed in one pass in paise"""
+
+    def __init__(self, lines, subtotal_paise, menu_version, missing_ids):
+        self.lines = lines
+        self.subtotal_paise = subtotal_paise
+        self.amount_paise = subtotal_paise  # no taxes or discounts yet
+        self.menu_version = menu_version
+        self.missing_ids = missing_ids
+
+    @property
+    def subtotal(self):
+        return from_paise(self.subtotal_paise)
+
+    @property
+    def total(self):
+        return from_paise(self.amount_paise)
+
+    @property
+    def item_count(self):
+        return sum(line["quantity"] for line in self.lines)
+
+    def order_items(self):
+        """Fresh line-item dicts safe to store on an order document"""
+        return [
+            {
+                "id": line["id"],
+                "name": line["name"],
+                "price": line["price"],
+                "quantity": line["quantity"],
+                "total": line["total"]
+            }
+            for line in self.lines
+        ]
+
+
+class PricingEngine:
+    """Prices carts against a menu catalog, memoized on (menu version, cart contents)"""
+
+    def __init__(self, cache_size=QUOTE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._quotes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def price_cart(self, cart, catalog):
+        key = (catalog.version, tuple(sorted(cart.items())))
+
+        with self._lock:
+            quote = self._quotes.get(key)
+            if quote is not None:
+                self._quotes.move_to_end(key)
+                return quote
+
+        quote = self._compute(cart, catalog)
+
+        with self._lock:
+            self._quotes[key] = quote
+            if len(self._quotes) > self.cache_size:
+                self._quotes.popitem(last=False)
+        return quote
+
+    @staticmethod
+    def _compute(cart, catalog):
+        lines = []
+        missing_ids = []
+        subtotal_paise = 0
+
+        for item_id, qty in cart.items():
+            item = catalog.get(item_id)
+            if not item:
+                print(f"⚠️ Item {item_id} not found in menu lookup")
+                missing_ids.append(item_id)
+                continue
+
+            price_paise = to_paise(item["price"])
+            line_paise = price_paise * qty
+            subtotal_paise += line_paise
+
+            lines.append({
+                "id": item_id,
+                "name": item["name"],
+                "price": item["price"],
+                "quantity": qty,
+                "total": from_paise(line_paise),
+                "price_paise": price_paise,
+                "total_paise": line_paise
+            })
+
+        return CartQuote(tuple(lines), subtotal_paise, catalog.version, tuple(missing_ids))
+
+
+# Global pricing engine instance
+pricing_engine = PricingEngine()
+
+
+def price_cart(cart, catalog):
+    return pricing_engine.price_cart(cart, catalog)
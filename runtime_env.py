@@ -0,0 +1,12 @@
+import os
+
+# Serverless hosts (Vercel) freeze an instance as soon as its response is sent and
+# buffer streamed responses whole, so nothing that outlives a request works there:
+# background threads (write-behind queue, expiry sweeper, forecast catch-up) stall
+# and live streams never reach the browser
+SERVERLESS = bool(os.getenv("VERCEL"))
+
+
+def long_lived_feature(env_name):
+    """On/off switch read from env_name ("1"/"0"); off by default on serverless hosts"""
+    return os.getenv(env_name, "0" if SERVERLESS else "1") == "1"
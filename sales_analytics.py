@@ -0,0 +1,225 @@
+import sys
+import json
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+
+from firebase_config import (
+    get_orders_for_days,
+    iter_orders,
+    order_day_key,
+    order_created_ms,
+    order_local_hour
+)
+from pricing import to_paise, from_paise
+from menu_catalog import line_item_id
+
+ANALYTICS_DEFAULT_DAYS = 30
+
+# paymentStatus values, in code order; anything unrecognised maps to OTHER
+PAYMENT_STATUSES = ("PAID", "PENDING", "REJECTED", "FAILED", "OTHER")
+PAID, PENDING, REJECTED, FAILED, OTHER = range(len(PAYMENT_STATUSES))
+_STATUS_CODES = {status: code for code, status in enumerate(PAYMENT_STATUSES)}
+
+
+class OrderFrame:
+    """Order history as parallel NumPy columns
+
+    Order columns (one row per order): created_ms, hour, status, total_paise.
+    Line columns (one row per line item): order_index into the order
+    columns, item (code into item_ids), quantity, price_paise, line_paise.
+    Pass the menu catalog so older lines without an id map to menu items.
+    """
+
+    def __init__(self, orders, catalog=None):
+        created_ms, hours, statuses, totals = [], [], [], []
+        order_index, item_codes, quantities, prices, line_totals = [], [], [], [], []
+        item_codes_by_id = {}
+        self.item_ids = []
+        self.item_names = []
+
+        # The only per-order Python loop: every report below is array arithmetic
+        for order in orders:
+            ms = order_created_ms(order)
+            row = len(created_ms)
+            created_ms.append(ms)
+            hours.append(order_local_hour(ms))
+            statuses.append(_STATUS_CODES.get(order.get("paymentStatus"), OTHER))
+            totals.append(to_paise(order.get("totalAmount") or 0))
+
+            for line in order.get("items") or []:
+                item_id = line_item_id(line, catalog)
+                code = item_codes_by_id.get(item_id)
+                if code is None:
+                    code = item_codes_by_id[item_id] = len(self.item_ids)
+                    self.item_ids.append(item_id)
+                    self.item_names.append(line.get("name", item_id))
+                quantity = int(line.get("quantity") or 0)
+                price = to_paise(line.get("price") or 0)
+                order_index.append(row)
+                item_codes.append(code)
+                quantities.append(quantity)
+                prices.append(price)
+                line_totals.append(to_paise(line.get("total", 0)) or price * quantity)
+
+        self.created_ms = np.array(created_ms, dtype=np.int64)
+        self.hour = np.array(hours, dtype=np.int8)
+        self.status = np.array(statuses, dtype=np.int8)
+        self.total_paise = np.array(totals, dtype=np.int64)
+
+        self.order_index = np.array(order_index, dtype=np.int32)
+        self.item = np.array(item_codes, dtype=np.int32)
+        self.quantity = np.array(quantities, dtype=np.int32)
+        self.price_paise = np.array(prices, dtype=np.int64)
+        self.line_paise = np.array(line_totals, dtype=np.int64)
+
+    @property
+    def order_count(self):
+        return len(self.created_ms)
+
+    @property
+    def item_count(self):
+        return len(self.item_ids)
+
+    def paid_lines(self):
+        """Boolean mask over line rows belonging to paid orders"""
+        return self.status[self.order_index] == PAID
+
+
+# ---------------- REPORTS ----------------
+def hourly_revenue(frame):
+    """Paid revenue and order count per local hour of day"""
+    paid = frame.status == PAID
+    revenue = np.bincount(frame.hour[paid], weights=frame.total_paise[paid], minlength=24)
+    orders = np.bincount(frame.hour[paid], minlength=24)
+    return [
+        {"hour": hour, "orders": int(orders[hour]), "revenue": from_paise(int(revenue[hour]))}
+        for hour in range(24)
+    ]
+
+
+def top_items(frame, limit=10):
+    """Best sellers among paid orders, by quantity"""
+    paid = frame.paid_lines()
+    quantity = np.bincount(frame.item[paid], weights=frame.quantity[paid], minlength=frame.item_count)
+    revenue = np.bincount(frame.item[paid], weights=frame.line_paise[paid], minlength=frame.item_count)
+
+    ranked = np.argsort(-quantity, kind="stable")[:limit]
+    return [
+        {
+            "id": frame.item_ids[code],
+            "name": frame.item_names[code],
+            "quantity": int(quantity[code]),
+            "revenue": from_paise(int(revenue[code]))
+        }
+        for code in ranked
+        if quantity[code] > 0
+    ]
+
+
+def basket_pairs(frame, limit=10):
+    """Item pairs most often bought together in the same paid order"""
+    paid = frame.paid_lines()
+    if not paid.any() or frame.item_count < 2:
+        return []
+
+    # Order x item incidence matrix; its Gram matrix counts co-occurrences
+    baskets = np.zeros((frame.order_count, frame.item_count), dtype=np.int32)
+    baskets[frame.order_index[paid], frame.item[paid]] = 1
+    together = baskets.T @ baskets
+
+    first, second = np.triu_indices(frame.item_count, k=1)
+    counts = together[first, second]
+    ranked = np.argsort(-counts, kind="stable")[:limit]
+    return [
+        {
+            "items": [frame.item_names[first[i]], frame.item_names[second[i]]],
+            "ids": [frame.item_ids[first[i]], frame.item_ids[second[i]]],
+            "orders": int(counts[i])
+        }
+        for i in ranked
+        if counts[i] > 0
+    ]
+
+
+def payment_outcomes(frame):
+    """Order count per payment status, plus failure rate overall and per hour
+
+    Failure rate is rejected or failed orders over orders that reached a
+    verdict (paid, rejected or failed); abandoned PENDING orders are reported
+    separately.
+    """
+    counts = np.bincount(frame.status, minlength=len(PAYMENT_STATUSES))
+    failed = (frame.status == REJECTED) | (frame.status == FAILED)
+    decided = failed | (frame.status == PAID)
+
+    failed_by_hour = np.bincount(frame.hour[failed], minlength=24)
+    decided_by_hour = np.bincount(frame.hour[decided], minlength=24)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate_by_hour = np.where(decided_by_hour > 0, failed_by_hour / decided_by_hour, 0.0)
+
+    decided_total = int(decided.sum())
+    return {
+        "counts": {status: int(counts[code]) for code, status in enumerate(PAYMENT_STATUSES)},
+        "failureRate": round(int(failed.sum()) / decided_total, 4) if decided_total else 0.0,
+        "pendingRate": round(int(counts[PENDING]) / frame.order_count, 4) if frame.order_count else 0.0,
+        "failureRateByHour": [round(float(rate), 4) for rate in rate_by_hour]
+    }
+
+
+def build_report(frame, limit=10):
+    """Every analytics report for one loaded frame"""
+    return {
+        "orders": frame.order_count,
+        "lineItems": len(frame.item),
+        "hourlyRevenue": hourly_revenue(frame),
+        "topItems": top_items(frame, limit),
+        "basketPairs": basket_pairs(frame, limit),
+        "payments": payment_outcomes(frame)
+    }
+
+
+# ---------------- LOADING ----------------
+def default_range(days=ANALYTICS_DEFAULT_DAYS):
+    """(start_day, end_day) covering the last `days` business days"""
+    end_day = order_day_key()
+    start_day = (date.fromisoformat(end_day) - timedelta(days=days - 1)).isoformat()
+    return start_day, end_day
+
+
+def load_frame(start_day=None, end_day=None, catalog=None):
+    """Frame over the given day range, or over the whole history when no range is given"""
+    if start_day is None and end_day is None:
+        return OrderFrame(iter_orders(), catalog)
+    start_day = start_day or end_day
+    end_day = end_day or start_day
+    return OrderFrame(get_orders_for_days(start_day, end_day), catalog)
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sales analytics over order history")
+    parser.add_argument("--from", dest="start_day", help="first business day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_day", help="last business day (YYYY-MM-DD)")
+    parser.add_argument("--all", action="store_true", help="analyse the whole order history")
+    parser.add_argument("--top", type=int, default=10, help="rows in ranked reports")
+    args = parser.parse_args(argv)
+
+    from firebase_config import get_menu_snapshot
+    from menu_catalog import get_catalog
+    catalog = get_catalog(get_menu_snapshot())
+
+    if args.all:
+        frame = load_frame(catalog=catalog)
+    elif args.start_day or args.end_day:
+        frame = load_frame(args.start_day, args.end_day, catalog)
+    else:
+        frame = load_frame(*default_range(), catalog)
+
+    json.dump(build_report(frame, args.top), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
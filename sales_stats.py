@@ -0,0 +1,295 @@
+import os
+import sqlite3
+import threading
+
+from firebase_admin import firestore
+
+from pricing import to_paise, from_paise
+from menu_catalog import line_item_id
+
+SALES_STATS_COLLECTION = os.getenv("SALES_STATS_COLLECTION", "daily_stats")
+SALES_STATS_PATH = os.getenv(
+    "SALES_STATS_PATH",
+    os.path.join(os.getenv("ORDER_LOG_DIR", "local_orders"), "sales_stats.sqlite3")
+)
+
+
+def sale_delta(order, catalog=None):
+    """Per-item and per-category increments contributed by one paid order (amounts in paise)"""
+    items = {}
+    categories = {}
+    for line in order.get("items") or []:
+        item_id = line_item_id(line, catalog)
+        quantity = int(line.get("quantity") or 0)
+        revenue = to_paise(line.get("total", (line.get("price") or 0) * quantity))
+
+        item = items.setdefault(item_id, {"name": line.get("name", item_id), "quantity": 0, "revenuePaise": 0})
+        item["quantity"] += quantity
+        item["revenuePaise"] += revenue
+
+        menu_item = catalog.get(item_id) if catalog is not None else None
+        category = (menu_item or {}).get("category", "Others")
+        bucket = categories.setdefault(category, {"quantity": 0, "revenuePaise": 0})
+        bucket["quantity"] += quantity
+        bucket["revenuePaise"] += revenue
+
+    return {
+        "orderCount": 1,
+        "revenuePaise": to_paise(order.get("totalAmount") or 0),
+        "items": items,
+        "categories": categories
+    }
+
+
+def summarize_day(day, stats):
+    """Public shape of one day's aggregates: rupee amounts plus average ticket"""
+    order_count = stats.get("orderCount", 0)
+    revenue_paise = stats.get("revenuePaise", 0)
+    return {
+        "day": day,
+        "orderCount": order_count,
+        "revenue": from_paise(revenue_paise),
+        "averageTicket": from_paise(round(revenue_paise / order_count)) if order_count else 0,
+        "items": {
+            item_id: {
+                "name": item.get("name", item_id),
+                "quantity": item.get("quantity", 0),
+                "revenue": from_paise(item.get("revenuePaise", 0))
+            }
+            for item_id, item in (stats.get("items") or {}).items()
+        },
+        "categories": {
+            category: {
+                "quantity": bucket.get("quantity", 0),
+                "revenue": from_paise(bucket.get("revenuePaise", 0))
+            }
+            for category, bucket in (stats.get("categories") or {}).items()
+        }
+    }
+
+
+def summarize_range(days):
+    """Totals across several day summaries, with the best-selling item"""
+    order_count = sum(day["orderCount"] for day in days)
+    revenue_paise = sum(to_paise(day["revenue"]) for day in days)
+
+    quantities = {}
+    names = {}
+    for day in days:
+        for item_id, item in day["items"].items():
+            quantities[item_id] = quantities.get(item_id, 0) + item["quantity"]
+            names[item_id] = item["name"]
+    top_id = max(quantities, key=quantities.get) if quantities else None
+
+    return {
+        "orderCount": order_count,
+        "revenue": from_paise(revenue_paise),
+        "averageTicket": from_paise(round(revenue_paise / order_count)) if order_count else 0,
+        "topItem": {"id": top_id, "name": names[top_id], "quantity": quantities[top_id]} if top_id else None
+    }
+
+
+class SalesStats:
+    """Daily sales aggregates, folded in once per paid order
+
+    With Firebase each day is one daily_stats document updated with
+    server-side increments inside the same transaction that flags the order
+    as counted. Local orders go to a SQLite file next to the order log, where
+    a recorded-orders table plays the same role.
+    """
+
+    def __init__(self, get_db, path=SALES_STATS_PATH, collection=SALES_STATS_COLLECTION):
+        self.get_db = get_db
+        self.path = path
+        self.collection = collection
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    # ---------------- PUBLIC ----------------
+    def record(self, order_id, order, day, catalog=None):
+        """Add a paid order to its day's totals; False if it was already counted"""
+        delta = sale_delta(order, catalog)
+        db = self.get_db()
+        if db and not str(order_id).startswith("local_"):
+            return self._record_firestore(db, order_id, day, delta)
+        return self._record_local(order_id, day, delta)
+
+    def for_days(self, start_day, end_day):
+        """Summaries for every day in [start_day, end_day] that has sales, oldest first"""
+        db = self.get_db()
+        if db:
+            try:
+                docs = (
+                    db.collection(self.collection)
+                    .where("day", ">=", start_day)
+                    .where("day", "<=", end_day)
+                    .get()
+                )
+                days = [summarize_day(doc.id, doc.to_dict()) for doc in docs]
+                return sorted(days, key=lambda d: d["day"])
+            except Exception as e:
+                print(f"❌ Firebase sales stats read failed: {e}")
+                print("🔄 Using local sales stats")
+        return self._for_days_local(start_day, end_day)
+
+    # ---------------- FIRESTORE ----------------
+    def _record_firestore(self, db, order_id, day, delta):
+        order_ref = db.collection("orders").document(order_id)
+        stats_ref = db.collection(self.collection).document(day)
+
+        increments = {
+            "day": day,
+            "orderCount": firestore.Increment(delta["orderCount"]),
+            "revenuePaise": firestore.Increment(delta["revenuePaise"]),
+            "items": {
+                item_id: {
+                    "name": item["name"],
+                    "quantity": firestore.Increment(item["quantity"]),
+                    "revenuePaise": firestore.Increment(item["revenuePaise"])
+                }
+                for item_id, item in delta["items"].items()
+            },
+            "categories": {
+                category: {
+                    "quantity": firestore.Increment(bucket["quantity"]),
+                    "revenuePaise": firestore.Increment(bucket["revenuePaise"])
+                }
+                for category, bucket in delta["categories"].items()
+            },
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        }
+
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = order_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                print(f"⚠️ Order {order_id} not in Firebase yet, sales stats skipped")
+                return False
+            if (snapshot.to_dict() or {}).get("statsRecorded"):
+                return False
+            transaction.update(order_ref, {"statsRecorded": True})
+            transaction.set(stats_ref, increments, merge=True)
+            return True
+
+        return apply(db.transaction())
+
+    # ---------------- SQLITE ----------------
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    self._create_tables(conn)
+                    self._ready = True
+        return conn
+
+    def _create_tables(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS recorded_orders ("
+            " order_id TEXT PRIMARY KEY,"
+            " day TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_totals ("
+            " day TEXT PRIMARY KEY,"
+            " orders INTEGER NOT NULL,"
+            " revenue_paise INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_items ("
+            " day TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " quantity INTEGER NOT NULL,"
+            " revenue_paise INTEGER NOT NULL,"
+            " PRIMARY KEY (day, item_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_categories ("
+            " day TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " quantity INTEGER NOT NULL,"
+            " revenue_paise INTEGER NOT NULL,"
+            " PRIMARY KEY (day, category))"
+        )
+
+    def _record_local(self, order_id, day, delta):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO recorded_orders (order_id, day) VALUES (?, ?)",
+                (order_id, day)
+            ).rowcount
+            if not inserted:
+                conn.execute("ROLLBACK")
+                return False
+
+            conn.execute(
+                "INSERT INTO daily_totals (day, orders, revenue_paise) VALUES (?, ?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET orders = orders + excluded.orders, "
+                "revenue_paise = revenue_paise + excluded.revenue_paise",
+                (day, delta["orderCount"], delta["revenuePaise"])
+            )
+            conn.executemany(
+                "INSERT INTO daily_items (day, item_id, name, quantity, revenue_paise) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(day, item_id) DO UPDATE SET name = excluded.name, "
+                "quantity = quantity + excluded.quantity, "
+                "revenue_paise = revenue_paise + excluded.revenue_paise",
+                [
+                    (day, item_id, item["name"], item["quantity"], item["revenuePaise"])
+                    for item_id, item in delta["items"].items()
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO daily_categories (day, category, quantity, revenue_paise) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(day, category) DO UPDATE SET quantity = quantity + excluded.quantity, "
+                "revenue_paise = revenue_paise + excluded.revenue_paise",
+                [
+                    (day, category, bucket["quantity"], bucket["revenuePaise"])
+                    for category, bucket in delta["categories"].items()
+                ]
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _for_days_local(self, start_day, end_day):
+        try:
+            conn = self._connection()
+            stats = {}
+            for day, orders, revenue in conn.execute(
+                "SELECT day, orders, revenue_paise FROM daily_totals WHERE day BETWEEN ? AND ?",
+                (start_day, end_day)
+            ):
+                stats[day] = {"orderCount": orders, "revenuePaise": revenue, "items": {}, "categories": {}}
+
+            for day, item_id, name, quantity, revenue in conn.execute(
+                "SELECT day, item_id, name, quantity, revenue_paise FROM daily_items WHERE day BETWEEN ? AND ?",
+                (start_day, end_day)
+            ):
+                if day in stats:
+                    stats[day]["items"][item_id] = {"name": name, "quantity": quantity, "revenuePaise": revenue}
+
+            for day, category, quantity, revenue in conn.execute(
+                "SELECT day, category, quantity, revenue_paise FROM daily_categories WHERE day BETWEEN ? AND ?",
+                (start_day, end_day)
+            ):
+                if day in stats:
+                    stats[day]["categories"][category] = {"quantity": quantity, "revenuePaise": revenue}
+
+            return [summarize_day(day, stats[day]) for day in sorted(stats)]
+        except sqlite3.Error as e:
+            print(f"❌ Local sales stats read failed: {e}")
+            return []
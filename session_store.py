@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose contents live on the server; the cookie only carries its id"""
+
+    def __init__(self, initial=None, sid=None, rev=0, new=False, expires=0):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.rev = rev
+        self.new = new
+        self.expires = expires
+        self.modified = False
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Server-side sessions: per-worker LRU in front of a SQLite file shared by all workers
+
+    The cookie holds a signed "<sid>.<rev>" pair. Every write bumps rev, so a
+    worker can trust its LRU entry whenever the revision matches the cookie
+    and only goes to SQLite when another worker wrote the session last.
+    Sessions expire after permanent_session_lifetime of inactivity: with
+    SESSION_REFRESH_EACH_REQUEST, a read-only request pushes the expiry out
+    again once less than half the lifetime is left.
+    """
+
+    serializer = TaggedJSONSerializer()
+    purge_interval = 600  # seconds between sweeps of expired rows
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # sid -> (rev, expires, payload)
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_purge = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY,"
+            " rev INTEGER NOT NULL,"
+            " expires REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+        conn.commit()
+
+    # ---------------- STORAGE ----------------
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _cache_get(self, sid, rev):
+        with self._cache_lock:
+            entry = self._cache.get(sid)
+            if entry is None or entry[0] != rev:
+                return None
+            self._cache.move_to_end(sid)
+            return entry
+
+    def _cache_put(self, sid, rev, expires, payload):
+        with self._cache_lock:
+            self._cache[sid] = (rev, expires, payload)
+            self._cache.move_to_end(sid)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, sid):
+        with self._cache_lock:
+            self._cache.pop(sid, None)
+
+    def _load(self, sid, rev):
+        entry = self._cache_get(sid, rev)
+        if entry is None or entry[1] < time.time():
+            # Not cached, or cached expiry passed (another worker may have touched it since)
+            row = self._connection().execute(
+                "SELECT rev, expires, data FROM sessions WHERE sid = ?", (sid,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = row
+            self._cache_put(sid, *row)
+
+        stored_rev, expires, payload = entry
+        if expires < time.time():
+            return None
+        return stored_rev, expires, self.serializer.loads(payload)
+
+    def _store(self, sid, rev, expires, payload):
+        self._connection().execute(
+            "INSERT INTO sessions (sid, rev, expires, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(sid) DO UPDATE SET rev = excluded.rev, "
+            "expires = excluded.expires, data = excluded.data",
+            (sid, rev, expires, payload)
+        )
+        self._cache_put(sid, rev, expires, payload)
+        self._maybe_purge()
+
+    def _touch(self, sid, rev, expires):
+        """Extend an unchanged session's expiry without rewriting its data"""
+        self._connection().execute(
+            "UPDATE sessions SET expires = ? WHERE sid = ? AND rev = ?", (expires, sid, rev)
+        )
+        with self._cache_lock:
+            entry = self._cache.get(sid)
+            if entry is not None and entry[0] == rev:
+                self._cache[sid] = (rev, expires, entry[2])
+
+    def _delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        self._cache_drop(sid)
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            self._connection().execute("DELETE FROM sessions WHERE expires < ?", (now,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Session purge failed: {e}")
+
+    # ---------------- FLASK HOOKS ----------------
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-side-session")
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid, rev = self._signer(app).unsign(cookie).decode("utf-8").rsplit(".", 1)
+                loaded = self._load(sid, int(rev))
+                if loaded is not None:
+                    stored_rev, expires, data = loaded
+                    return ServerSideSession(data, sid=sid, rev=stored_rev, expires=expires)
+            except (BadSignature, ValueError):
+                pass
+            except sqlite3.Error as e:
+                print(f"❌ Session load failed: {e}")
+
+        return ServerSideSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expires = time.time() + lifetime
+
+        if not session.modified:
+            # Reads keep the session alive, touching the row at most twice per lifetime
+            if (not app.config["SESSION_REFRESH_EACH_REQUEST"]
+                    or session.expires - time.time() > lifetime / 2):
+                return
+            try:
+                self._touch(session.sid, session.rev, expires)
+            except sqlite3.Error as e:
+                print(f"❌ Session refresh failed: {e}")
+                return
+            if not session.permanent:
+                return  # browser-session cookie: nothing to re-send
+        else:
+            session.rev += 1
+            try:
+                self._store(session.sid, session.rev, expires, self.serializer.dumps(dict(session)))
+            except sqlite3.Error as e:
+                print(f"❌ Session save failed: {e}")
+                return
+        session.expires = expires
+
+        value = self._signer(app).sign(f"{session.sid}.{session.rev}").decode("utf-8")
+        response.set_cookie(
+            name,
+            value,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
@@ -0,0 +1,167 @@
+import os
+import hmac
+import hashlib
+import itertools
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+# Keep the local order log, stats and sessions out of the working tree
+_DATA_DIR = tempfile.mkdtemp(prefix="tea-test-")
+os.environ.setdefault("ORDER_LOG_DIR", os.path.join(_DATA_DIR, "local_orders"))
+os.environ.setdefault("SESSION_SQLITE_PATH", os.path.join(_DATA_DIR, "sessions.sqlite3"))
+os.environ.setdefault("TRANSACTION_EXPIRY_SWEEPER", "0")
+
+import pytest
+
+import app as tea_app
+import transaction_manager
+from firebase_config import save_order_local_fallback, get_order
+from payment_gateway import payment_gateway
+
+
+# ---------------- IN-MEMORY FIRESTORE ----------------
+class _WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class _Snapshot:
+    def __init__(self, ref):
+        self.id = ref.id
+        self.exists = ref.id in ref.store
+        self.update_time = ref.times.get(ref.id)
+        self._data = dict(ref.store.get(ref.id, {}))
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Ref:
+    def __init__(self, db, collection, doc_id):
+        self.id = doc_id
+        self.store = db.data.setdefault(collection, {})
+        self.times = db.times.setdefault(collection, {})
+        self._clock = db.clock
+
+    def get(self, **kwargs):
+        return _Snapshot(self)
+
+    def set(self, data, **kwargs):
+        self.store[self.id] = dict(data)
+        self.times[self.id] = next(self._clock)
+        return _WriteResult(self.times[self.id])
+
+    def update(self, data, option=None):
+        if option is not None and option != self.times.get(self.id):
+            raise AssertionError("stale write precondition")
+        self.store[self.id].update(data)
+        self.times[self.id] = next(self._clock)
+        return _WriteResult(self.times[self.id])
+
+
+class _Collection:
+    def __init__(self, db, name):
+        self._db = db
+        self._name = name
+
+    def document(self, doc_id):
+        return _Ref(self._db, self._name, doc_id)
+
+
+class _Batch:
+    def __init__(self):
+        self._ops = []
+
+    def set(self, ref, data):
+        self._ops.append((ref.set, data, {}))
+
+    def update(self, ref, data, option=None):
+        self._ops.append((ref.update, data, {"option": option}))
+
+    def commit(self):
+        return [op(data, **kwargs) for op, data, kwargs in self._ops]
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.data = {}
+        self.times = {}
+        self.clock = itertools.count(1)
+
+    def collection(self, name):
+        return _Collection(self, name)
+
+    def batch(self):
+        return _Batch()
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+
+# ---------------- TESTS ----------------
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(transaction_manager, "get_db", lambda: fake)
+    return fake
+
+
+def test_verify_payment_success(db):
+    order = {
+        "orderId": "TEA-1001",
+        "customerName": "Test Customer",
+        "items": [{"id": "3", "name": "Masala Tea", "price": 10, "quantity": 2, "total": 20}],
+        "totalAmount": 20,
+        "paymentStatus": "PENDING",
+        "orderStatus": "PENDING"
+    }
+    order_id = save_order_local_fallback(order)
+
+    transaction_id = "txn_test0001"
+    db.collection("transactions").document(transaction_id).set({
+        "transaction_id": transaction_id,
+        "order_id": order_id,
+        "amount": 20,
+        "status": "PROCESSING",
+        "gateway_order_id": "order_test0001",
+        "security_token": "token-0001",
+        "expires_at": datetime.now(timezone.utc) + timedelta(minutes=15),
+        "retry_count": 0,
+        "ip_address": None
+    })
+
+    payment_id = "pay_test0001"
+    signature = hmac.new(
+        payment_gateway.api_secret.encode("utf-8"),
+        f"order_test0001|{payment_id}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+
+    client = tea_app.app.test_client()
+    with client.session_transaction() as session:
+        session["pending_payment"] = {
+            "order_id": order_id,
+            "order_code": "TEA-1001",
+            "total": 20,
+            "total_paise": 2000,
+            "transaction_id": transaction_id,
+            "security_token": "token-0001"
+        }
+
+    response = client.post("/payment/verify", json={
+        "order_id": "order_test0001",
+        "payment_id": payment_id,
+        "signature": signature
+    })
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()["success"] is True
+
+    transaction = db.data["transactions"][transaction_id]
+    assert transaction["status"] == "SUCCESS"
+    assert transaction["gateway_payment_id"] == payment_id
+    assert db.data["transaction_lookup"][f"gateway_payment_id:{payment_id}"]["transaction_id"] == transaction_id
+
+    stored = get_order(order_id)
+    assert stored["paymentStatus"] == "PAID"
+    assert stored["orderStatus"] == "CONFIRMED"
@@ -1,7 +1,294 @@
 from datetime import datetime, timezone, timedelta
-from firebase_config import get_db
+from collections import OrderedDict
+from flask import g, has_app_context
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition
+from firebase_config import get_db, update_order, ensure_order_committed, with_sync_stamp
+from order_events import publish_order_updated
+import os
+import time
 import uuid
+import heapq
 import secrets
+import threading
+
+from runtime_env import long_lived_feature
+
+TRANSACTION_CACHE_TTL = float(os.getenv("TRANSACTION_CACHE_TTL", "5"))  # seconds, open transactions
+TRANSACTION_FINAL_CACHE_TTL = float(os.getenv("TRANSACTION_FINAL_CACHE_TTL", "300"))  # seconds, final states
+TRANSACTION_CACHE_SIZE = int(os.getenv("TRANSACTION_CACHE_SIZE", "1024"))
+TRANSITION_BATCH_LIMIT = 500  # writes per Firestore transaction
+TRANSACTION_LOOKUP_COLLECTION = os.getenv("TRANSACTION_LOOKUP_COLLECTION", "transaction_lookup")
+TRANSACTION_LOOKUP_CACHE_SIZE = int(os.getenv("TRANSACTION_LOOKUP_CACHE_SIZE", "4096"))
+TRANSACTION_SWEEP_INTERVAL = float(os.getenv("TRANSACTION_SWEEP_INTERVAL", "60"))  # seconds
+# Extra time before PROCESSING is expired: a verify may still be waiting on the gateway capture
+TRANSACTION_PROCESSING_GRACE = float(os.getenv("TRANSACTION_PROCESSING_GRACE", "120"))  # seconds
+TRANSACTION_EXPIRY_SWEEPER = long_lived_feature("TRANSACTION_EXPIRY_SWEEPER")
+
+# Transaction fields with a lookup entry; each value belongs to exactly one transaction
+LOOKUP_FIELDS = ("order_id", "gateway_order_id", "gateway_payment_id")
+
+# Statuses a transaction can still expire from
+OPEN_STATUSES = ("INITIATED", "PROCESSING")
+
+# Allowed status transitions; states with none are final
+ALLOWED_TRANSITIONS = {
+    "INITIATED": ["PROCESSING", "CANCELLED", "EXPIRED"],
+    "PROCESSING": ["SUCCESS", "FAILED", "CANCELLED", "EXPIRED"],
+    "SUCCESS": [],  # Final state
+    "FAILED": ["PROCESSING"],  # Allow retry
+    "CANCELLED": [],  # Final state
+    "EXPIRED": ["INITIATED"]  # Allow re-initiation
+}
+
+
+def expiry_deadline(transaction_data):
+    """Epoch seconds after which the background expiry may move a transaction to EXPIRED, or None"""
+    expires_at = transaction_data.get("expires_at")
+    status = transaction_data.get("status")
+    if status not in OPEN_STATUSES or not isinstance(expires_at, datetime):
+        return None
+    deadline = expires_at.timestamp()
+    if status == "PROCESSING":
+        deadline += TRANSACTION_PROCESSING_GRACE
+    return deadline
+
+
+class TransactionCache:
+    """Read-through cache of transaction documents, per request and per process
+
+    Within a request (flask.g) a transaction is read from Firestore at most
+    once and every write through TransactionManager updates the copy. Across
+    requests the process cache keeps open transactions for a few seconds, but
+    final ones (SUCCESS, CANCELLED) for much longer, since no transition can
+    change them again.
+    """
+
+    def __init__(self, ttl=TRANSACTION_CACHE_TTL, final_ttl=TRANSACTION_FINAL_CACHE_TTL,
+                 max_size=TRANSACTION_CACHE_SIZE):
+        self.ttl = ttl
+        self.final_ttl = final_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # transaction_id -> (expires monotonic, data, update_time)
+        self._lock = threading.Lock()
+
+    def _request_scope(self):
+        if not has_app_context():
+            return None
+        scope = g.get("_transactions")
+        if scope is None:
+            scope = g._transactions = {}
+        return scope
+
+    def get(self, transaction_id, fresh=False):
+        """Cached copy, or None on a miss; fresh=True only trusts this request's copy"""
+        scope = self._request_scope()
+        if scope is not None and transaction_id in scope:
+            return dict(scope[transaction_id][0])
+        if fresh:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[transaction_id]
+                return None
+            self._entries.move_to_end(transaction_id)
+            data, update_time = entry[1], entry[2]
+
+        if scope is not None:
+            scope[transaction_id] = (data, update_time)
+        return dict(data)
+
+    def version(self, transaction_id):
+        """Firestore update_time of this request's copy, or None if unknown"""
+        scope = self._request_scope()
+        if scope is None or transaction_id not in scope:
+            return None
+        return scope[transaction_id][1]
+
+    def put(self, transaction_id, data, update_time=None):
+        data = dict(data)
+        final = not ALLOWED_TRANSITIONS.get(data.get("status"), [])
+        expires = time.monotonic() + (self.final_ttl if final else self.ttl)
+
+        with self._lock:
+            self._entries[transaction_id] = (expires, data, update_time)
+            self._entries.move_to_end(transaction_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        scope = self._request_scope()
+        if scope is not None:
+            scope[transaction_id] = (data, update_time)
+
+    def drop(self, transaction_id):
+        with self._lock:
+            self._entries.pop(transaction_id, None)
+        scope = self._request_scope()
+        if scope is not None:
+            scope.pop(transaction_id, None)
+
+
+# Global transaction cache instance
+transaction_cache = TransactionCache()
+
+
+class TransactionLookup:
+    """Secondary index from order and gateway ids to transaction ids
+
+    Every lookup field a transaction sets gets a transaction_lookup document
+    keyed "<field>:<value>", written in the same commit as the field itself,
+    so finding a transaction is one point read instead of a query. Entries
+    never change once written, so this process caches them without expiry.
+    """
+
+    def __init__(self, collection=TRANSACTION_LOOKUP_COLLECTION, max_size=TRANSACTION_LOOKUP_CACHE_SIZE):
+        self.collection = collection
+        self.max_size = max_size
+        self._entries = OrderedDict()  # "<field>:<value>" -> transaction_id
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(field, value):
+        return f"{field}:{value}"
+
+    def entries(self, transaction_id, fields):
+        """(key, document) for every lookup field set in fields"""
+        return [
+            (self.key(field, fields[field]), {
+                "transaction_id": transaction_id,
+                "field": field,
+                "value": fields[field]
+            })
+            for field in LOOKUP_FIELDS
+            if fields.get(field)
+        ]
+
+    def stage(self, db, write_target, transaction_id, fields):
+        """Add the lookup writes for fields to a batch or Firestore transaction"""
+        for key, entry in self.entries(transaction_id, fields):
+            write_target.set(db.collection(self.collection).document(key), entry)
+
+    def remember(self, transaction_id, fields):
+        with self._lock:
+            for key, _ in self.entries(transaction_id, fields):
+                self._entries[key] = transaction_id
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def find(self, db, field, value):
+        """Transaction id for field == value, or None if it isn't indexed"""
+        key = self.key(field, value)
+        with self._lock:
+            transaction_id = self._entries.get(key)
+            if transaction_id is not None:
+                self._entries.move_to_end(key)
+                return transaction_id
+
+        doc = db.collection(self.collection).document(key).get()
+        if not doc.exists:
+            return None
+        transaction_id = doc.to_dict().get("transaction_id")
+        self.remember(transaction_id, {field: value})
+        return transaction_id
+
+
+# Global transaction lookup instance
+transaction_lookup = TransactionLookup()
+
+
+class TransactionExpiryScheduler:
+    """Background expiry of open transactions, so reads never have to write
+
+    Each worker keeps a min-heap of the expires_at deadlines it has seen and
+    expires them as they fall due. A periodic sweep also queries Firestore for
+    open transactions past their deadline (created by other workers or before
+    a restart). Both commit EXPIRED in batches through the transition checks,
+    so racing workers or a payment completing meanwhile are simply skipped.
+    PROCESSING transactions get TRANSACTION_PROCESSING_GRACE on top of
+    expires_at, so a payment captured just before the deadline still lands.
+    """
+
+    def __init__(self, sweep_interval=TRANSACTION_SWEEP_INTERVAL, enabled=TRANSACTION_EXPIRY_SWEEPER):
+        self.sweep_interval = sweep_interval
+        self.enabled = enabled
+        self._heap = []  # (deadline epoch seconds, transaction_id)
+        self._deadlines = {}  # transaction_id -> deadline; missing means cancelled
+        self._cond = threading.Condition()
+        self._pid = None
+        self._thread = None
+
+    def track(self, transaction_id, transaction_data):
+        """Schedule an open transaction's expiry, or forget it once it has moved on"""
+        deadline = expiry_deadline(transaction_data)
+        if deadline is None:
+            with self._cond:
+                self._deadlines.pop(transaction_id, None)
+            return
+
+        with self._cond:
+            if self._deadlines.get(transaction_id) == deadline:
+                return
+            self._deadlines[transaction_id] = deadline
+            heapq.heappush(self._heap, (deadline, transaction_id))
+            if self._heap[0][1] == transaction_id:
+                self._cond.notify()
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if not self.enabled:
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="transaction-expiry", daemon=True)
+            self._thread.start()
+
+    def _due(self):
+        """Pop every tracked transaction whose deadline has passed (lock held)"""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < TRANSITION_BATCH_LIMIT:
+            deadline, transaction_id = heapq.heappop(self._heap)
+            if self._deadlines.get(transaction_id) == deadline:
+                del self._deadlines[transaction_id]
+                due.append(transaction_id)
+        return due
+
+    def _run(self):
+        next_sweep = time.monotonic()
+        while True:
+            with self._cond:
+                due = self._due()
+                if not due:
+                    wait = next_sweep - time.monotonic()
+                    if self._heap:
+                        wait = min(wait, self._heap[0][0] - time.time())
+                    if wait > 0:
+                        self._cond.wait(wait)
+                    due = self._due()
+
+            try:
+                if due:
+                    TransactionManager.expire_transactions(due)
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    TransactionManager.cleanup_expired_transactions()
+            except Exception as e:
+                print(f"❌ Transaction expiry failed: {e}")
+
+
+# Global transaction expiry scheduler instance
+expiry_scheduler = TransactionExpiryScheduler()
+
 
 class TransactionManager:
     """Secure Transaction Management System"""
@@ -34,83 +321,174 @@ class TransactionManager:
             "user_agent": None   # Will be set from request
         }
         
-        # Store transaction
-        db.collection("transactions").document(transaction_id).set(transaction_data)
+        # Store transaction together with its order_id lookup entry
+        batch = db.batch()
+        batch.set(db.collection("transactions").document(transaction_id), transaction_data)
+        transaction_lookup.stage(db, batch, transaction_id, transaction_data)
+        results = batch.commit()
+        TransactionManager._remember(transaction_id, transaction_data, results[0].update_time)
         
         return transaction_data
     
     @staticmethod
-    def update_transaction_status(transaction_id, status, **kwargs):
-        """Update transaction status with security checks"""
-        db = get_db()
-        
-        transaction_ref = db.collection("transactions").document(transaction_id)
-        transaction_doc = transaction_ref.get()
+    def _remember(transaction_id, transaction_data, update_time=None):
+        """Cache a transaction we just read or wrote and keep its expiry scheduled"""
+        transaction_cache.put(transaction_id, transaction_data, update_time)
+        transaction_lookup.remember(transaction_id, transaction_data)
+        expiry_scheduler.track(transaction_id, transaction_data)
+    
+    @staticmethod
+    def _load(transaction_id, fresh=False):
+        """Transaction document through the cache; fresh=True skips the process-wide copy"""
+        cached = transaction_cache.get(transaction_id, fresh=fresh)
+        if cached is not None:
+            return cached
         
+        db = get_db()
+        transaction_doc = db.collection("transactions").document(transaction_id).get()
         if not transaction_doc.exists:
-            raise Exception("Transaction not found")
+            return None
         
         transaction_data = transaction_doc.to_dict()
+        TransactionManager._remember(transaction_id, transaction_data, transaction_doc.update_time)
+        return transaction_data
+    
+    @staticmethod
+    def _check_transition(transaction_data, status):
+        """Raise unless status is reachable from the transaction's current status"""
+        current = transaction_data.get("status")
+        if status not in ALLOWED_TRANSITIONS.get(current, []):
+            raise Exception(f"Invalid status transition from {current} to {status}")
+    
+    @staticmethod
+    def update_transaction_status(transaction_id, status, **kwargs):
+        """Update transaction status with security checks, returning the merged document
         
-        # Security check: Don't allow status downgrade
-        status_hierarchy = {
-            "INITIATED": 0,
-            "PROCESSING": 1,
-            "SUCCESS": 2,
-            "FAILED": 3,
-            "CANCELLED": 4,
-            "EXPIRED": 5
-        }
-        
-        current_level = status_hierarchy.get(transaction_data.get("status", "INITIATED"), 0)
-        new_level = status_hierarchy.get(status, 0)
-        
-        # Allow certain transitions
-        allowed_transitions = {
-            "INITIATED": ["PROCESSING", "CANCELLED", "EXPIRED"],
-            "PROCESSING": ["SUCCESS", "FAILED", "CANCELLED"],
-            "SUCCESS": [],  # Final state
-            "FAILED": ["PROCESSING"],  # Allow retry
-            "CANCELLED": [],  # Final state
-            "EXPIRED": ["INITIATED"]  # Allow re-initiation
-        }
-        
-        if status not in allowed_transitions.get(transaction_data.get("status"), []):
-            raise Exception(f"Invalid status transition from {transaction_data.get('status')} to {status}")
+        If this request already read the transaction, the write is a single
+        compare-and-set on its update_time. Otherwise (or if someone changed it
+        meanwhile) the check and write run in one Firestore transaction, so two
+        concurrent verifies can't both move it out of the same state.
+        """
+        db = get_db()
+        transaction_ref = db.collection("transactions").document(transaction_id)
         
-        # Update transaction
         update_data = {
             "status": status,
             "updated_at": datetime.now(timezone.utc),
             **kwargs
         }
         
-        transaction_ref.update(update_data)
-        
-        # Return updated transaction
-        updated_doc = transaction_ref.get()
-        return updated_doc.to_dict()
+        known = transaction_cache.get(transaction_id, fresh=True)
+        known_version = transaction_cache.version(transaction_id)
+        if known is not None and known_version is not None:
+            TransactionManager._check_transition(known, status)
+            try:
+                option = db.write_option(last_update_time=known_version)
+                if transaction_lookup.entries(transaction_id, kwargs):
+                    # New gateway ids are indexed in the same commit
+                    batch = db.batch()
+                    batch.update(transaction_ref, update_data, option=option)
+                    transaction_lookup.stage(db, batch, transaction_id, kwargs)
+                    update_time = batch.commit()[0].update_time
+                else:
+                    update_time = transaction_ref.update(update_data, option=option).update_time
+                known.update(update_data)
+                TransactionManager._remember(transaction_id, known, update_time)
+                return known
+            except FailedPrecondition:
+                print(f"🔄 Transaction {transaction_id} changed meanwhile, re-checking transition")
+        
+        @firestore.transactional
+        def apply(firestore_transaction):
+            snapshot = transaction_ref.get(transaction=firestore_transaction)
+            if not snapshot.exists:
+                raise Exception("Transaction not found")
+            
+            transaction_data = snapshot.to_dict()
+            TransactionManager._check_transition(transaction_data, status)
+            firestore_transaction.update(transaction_ref, update_data)
+            transaction_lookup.stage(db, firestore_transaction, transaction_id, kwargs)
+            transaction_data.update(update_data)
+            return transaction_data
+        
+        transaction_data = apply(db.transaction())
+        TransactionManager._remember(transaction_id, transaction_data)
+        return transaction_data
+    
+    @staticmethod
+    def update_transaction_statuses(transitions, guard=None):
+        """Apply many (transaction_id, status, fields) transitions atomically per batch
+        
+        Each batch of up to 500 is one Firestore transaction: one read of all
+        its documents and one commit. Returns (updated, errors) dicts keyed by
+        transaction id; invalid transitions are skipped, not raised, as are
+        documents for which guard(transaction_data) returns an error message.
+        """
+        db = get_db()
+        updated = {}
+        errors = {}
+        
+        for start in range(0, len(transitions), TRANSITION_BATCH_LIMIT):
+            chunk = transitions[start:start + TRANSITION_BATCH_LIMIT]
+            refs = {
+                transaction_id: db.collection("transactions").document(transaction_id)
+                for transaction_id, _, _ in chunk
+            }
+            
+            @firestore.transactional
+            def apply(firestore_transaction):
+                snapshots = {
+                    snapshot.id: snapshot
+                    for snapshot in firestore_transaction.get_all(list(refs.values()))
+                }
+                now = datetime.now(timezone.utc)
+                chunk_updated = {}
+                chunk_errors = {}
+                for transaction_id, status, fields in chunk:
+                    snapshot = snapshots.get(transaction_id)
+                    if snapshot is None or not snapshot.exists:
+                        chunk_errors[transaction_id] = "Transaction not found"
+                        continue
+                    
+                    transaction_data = chunk_updated.get(transaction_id) or snapshot.to_dict()
+                    try:
+                        TransactionManager._check_transition(transaction_data, status)
+                    except Exception as e:
+                        chunk_errors[transaction_id] = str(e)
+                        continue
+                    error = guard(transaction_data) if guard else None
+                    if error:
+                        chunk_errors[transaction_id] = error
+                        continue
+                    
+                    update_data = {"status": status, "updated_at": now, **(fields or {})}
+                    firestore_transaction.update(refs[transaction_id], update_data)
+                    transaction_lookup.stage(db, firestore_transaction, transaction_id, fields or {})
+                    transaction_data.update(update_data)
+                    chunk_updated[transaction_id] = transaction_data
+                return chunk_updated, chunk_errors
+            
+            chunk_updated, chunk_errors = apply(db.transaction())
+            for transaction_id, transaction_data in chunk_updated.items():
+                TransactionManager._remember(transaction_id, transaction_data)
+            updated.update(chunk_updated)
+            errors.update(chunk_errors)
+        
+        return updated, errors
     
     @staticmethod
     def get_transaction(transaction_id):
         """Get transaction with security validation"""
-        db = get_db()
-        
-        transaction_doc = db.collection("transactions").document(transaction_id).get()
+        transaction_data = TransactionManager._load(transaction_id)
         
-        if not transaction_doc.exists:
+        if transaction_data is None:
             return None
         
-        transaction_data = transaction_doc.to_dict()
-        
         # Security check: Check if transaction is expired
+        # Report it as EXPIRED right away; the expiry scheduler writes the transition
         if transaction_data.get("expires_at"):
             if datetime.now(timezone.utc) > transaction_data["expires_at"]:
-                if transaction_data.get("status") in ["INITIATED", "PROCESSING"]:
-                    # Auto-expire transaction
-                    TransactionManager.update_transaction_status(
-                        transaction_id, "EXPIRED"
-                    )
+                if transaction_data.get("status") in OPEN_STATUSES:
                     transaction_data["status"] = "EXPIRED"
         
         return transaction_data
@@ -135,70 +513,221 @@ class TransactionManager:
         return {"valid": True, "transaction": transaction}
     
     @staticmethod
-    def record_payment_attempt(transaction_id, payment_data, request):
-        """Record payment attempt with security context"""
-        db = get_db()
-        
-        attempt_data = {
+    def _attempt_record(transaction_id, payment_data, request, status="ATTEMPTED"):
+        return {
             "attempt_id": f"att_{secrets.token_hex(8)}",
             "transaction_id": transaction_id,
             "gateway_order_id": payment_data.get("order_id"),
             "gateway_payment_id": payment_data.get("payment_id"),
             "gateway_signature": payment_data.get("signature"),
             "amount": payment_data.get("amount"),
-            "status": "ATTEMPTED",
+            "status": status,
             "ip_address": request.remote_addr,
             "user_agent": request.headers.get("User-Agent"),
             "created_at": datetime.now(timezone.utc)
         }
+    
+    @staticmethod
+    def record_payment_attempt(transaction_id, payment_data, request):
+        """Record payment attempt with security context"""
+        db = get_db()
+        
+        attempt_data = TransactionManager._attempt_record(transaction_id, payment_data, request)
         
         # Store attempt
         db.collection("payment_attempts").document(attempt_data["attempt_id"]).set(attempt_data)
         
         # Update transaction retry count
-        transaction = TransactionManager.get_transaction(transaction_id)
+        transaction = TransactionManager._load(transaction_id, fresh=True)
         if transaction:
-            retry_count = transaction.get("retry_count", 0) + 1
-            db.collection("transactions").document(transaction_id).update({
-                "retry_count": retry_count,
+            retry_update = {
+                "retry_count": transaction.get("retry_count", 0) + 1,
                 "ip_address": request.remote_addr,
                 "user_agent": request.headers.get("User-Agent")
-            })
+            }
+            result = db.collection("transactions").document(transaction_id).update(retry_update)
+            transaction.update(retry_update)
+            TransactionManager._remember(transaction_id, transaction, result.update_time)
         
         return attempt_data
     
     @staticmethod
-    def get_transaction_by_order_id(order_id):
-        """Get transaction by order ID"""
+    def commit_payment(transaction_id, payment_data, request, order_id, order_changes, **kwargs):
+        """Record a captured payment in one atomic write: attempt, transaction SUCCESS and order
+        
+        Uses a single write batch guarded by the transaction's update_time when
+        this request already read it, else a Firestore transaction. Local
+        (offline) orders aren't in Firestore and are updated after the commit.
+        Returns the merged transaction document.
+        """
         db = get_db()
+        transaction_ref = db.collection("transactions").document(transaction_id)
+        attempt_data = TransactionManager._attempt_record(transaction_id, payment_data, request, "CAPTURED")
+        attempt_ref = db.collection("payment_attempts").document(attempt_data["attempt_id"])
+        
+        now = datetime.now(timezone.utc)
+        order_changes = {"updatedAt": now, **order_changes}
+        local_order = str(order_id).startswith("local_")
+        if not local_order:
+            ensure_order_committed(order_id)  # the batch updates orders/<id>, which must exist
+        
+        def writes(transaction_data):
+            """Validate against transaction_data and return the transaction fields to write"""
+            current = transaction_data.get("status")
+            if current == "INITIATED":
+                # Paid straight from the initial state: pass through PROCESSING
+                TransactionManager._check_transition(transaction_data, "PROCESSING")
+                current = "PROCESSING"
+            TransactionManager._check_transition({"status": current}, "SUCCESS")
+            return {
+                "status": "SUCCESS",
+                "updated_at": now,
+                "retry_count": transaction_data.get("retry_count", 0) + 1,
+                "ip_address": request.remote_addr,
+                "user_agent": request.headers.get("User-Agent"),
+                **kwargs
+            }
+        
+        def stage(write_target, transaction_update, option=None):
+            write_target.set(attempt_ref, attempt_data)
+            if option is None:
+                write_target.update(transaction_ref, transaction_update)
+            else:
+                write_target.update(transaction_ref, transaction_update, option=option)
+            if not local_order:
+                write_target.update(db.collection("orders").document(order_id), with_sync_stamp(order_changes))
+            transaction_lookup.stage(db, write_target, transaction_id, kwargs)
+        
+        transaction_data = None
+        known = transaction_cache.get(transaction_id, fresh=True)
+        known_version = transaction_cache.version(transaction_id)
+        if known is not None and known_version is not None:
+            transaction_update = writes(known)
+            batch = db.batch()
+            stage(batch, transaction_update, db.write_option(last_update_time=known_version))
+            try:
+                results = batch.commit()
+                known.update(transaction_update)
+                transaction_data = known
+                TransactionManager._remember(transaction_id, transaction_data, results[1].update_time)
+            except FailedPrecondition:
+                print(f"🔄 Transaction {transaction_id} changed meanwhile, re-checking before commit")
+        
+        if transaction_data is None:
+            @firestore.transactional
+            def apply(firestore_transaction):
+                snapshot = transaction_ref.get(transaction=firestore_transaction)
+                if not snapshot.exists:
+                    raise Exception("Transaction not found")
+                current_data = snapshot.to_dict()
+                transaction_update = writes(current_data)
+                stage(firestore_transaction, transaction_update)
+                current_data.update(transaction_update)
+                return current_data
+            
+            transaction_data = apply(db.transaction())
+            TransactionManager._remember(transaction_id, transaction_data)
+        
+        if local_order:
+            update_order(order_id, order_changes)
+        else:
+            publish_order_updated(order_id, order_changes)
         
-        transactions = db.collection("transactions")\
-                          .where("order_id", "==", order_id)\
-                          .order_by("created_at", direction="DESCENDING")\
-                          .limit(1)\
-                          .get()
-        
-        for doc in transactions:
-            return doc.to_dict()
-        
-        return None
+        return transaction_data
     
     @staticmethod
-    def cleanup_expired_transactions():
-        """Clean up expired transactions (background task)"""
+    def _find_by(field, value):
+        """Transaction whose lookup field equals value: index point read, then the document"""
         db = get_db()
         
-        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=24)
+        transaction_id = transaction_lookup.find(db, field, value)
+        if transaction_id:
+            return TransactionManager._load(transaction_id)
         
-        expired_transactions = db.collection("transactions")\
-                                 .where("created_at", "<", cutoff_time)\
-                                 .where("status", "in", ["INITIATED", "PROCESSING", "FAILED"])\
-                                 .get()
+        # Not indexed: a transaction from before the lookup collection existed
+        query = db.collection("transactions").where(field, "==", value)
+        if field == "order_id":
+            query = query.order_by("created_at", direction="DESCENDING")
         
-        for doc in expired_transactions:
-            doc.reference.update({"status": "EXPIRED"})
+        for doc in query.limit(1).get():
+            transaction_data = doc.to_dict()
+            batch = db.batch()
+            transaction_lookup.stage(db, batch, doc.id, {field: value})
+            batch.commit()
+            TransactionManager._remember(doc.id, transaction_data, doc.update_time)
+            return transaction_data
         
-        return len(expired_transactions)
+        return None
+    
+    @staticmethod
+    def get_transaction_by_order_id(order_id):
+        """Get transaction by order ID"""
+        return TransactionManager._find_by("order_id", order_id)
+    
+    @staticmethod
+    def get_transaction_by_gateway_order_id(gateway_order_id):
+        """Get transaction by payment gateway order ID"""
+        return TransactionManager._find_by("gateway_order_id", gateway_order_id)
+    
+    @staticmethod
+    def get_transaction_by_gateway_payment_id(gateway_payment_id):
+        """Get transaction by payment gateway payment ID"""
+        return TransactionManager._find_by("gateway_payment_id", gateway_payment_id)
+    
+    @staticmethod
+    def expire_transactions(transaction_ids):
+        """Move the given transactions to EXPIRED in batches; returns how many changed
+        
+        Each one is re-checked against its current deadline inside the write,
+        so a transaction that moved to PROCESSING meanwhile gets its grace period.
+        """
+        if not transaction_ids:
+            return 0
+        
+        def not_due(transaction_data):
+            deadline = expiry_deadline(transaction_data)
+            if deadline is None or deadline > time.time():
+                return "Not due for expiry"
+            return None
+        
+        updated, _ = TransactionManager.update_transaction_statuses(
+            [(transaction_id, "EXPIRED", None) for transaction_id in transaction_ids],
+            guard=not_due
+        )
+        if updated:
+            print(f"⏰ Expired {len(updated)} transaction(s)")
+        return len(updated)
+    
+    @staticmethod
+    def cleanup_expired_transactions():
+        """Expire every open transaction past its deadline (background sweep)
+        
+        Needs the composite index (status, expires_at) on transactions, see
+        FIREBASE_SETUP.md.
+        """
+        db = get_db()
+        if not db:
+            return 0
+        
+        expired = 0
+        for status in OPEN_STATUSES:
+            grace = TRANSACTION_PROCESSING_GRACE if status == "PROCESSING" else 0
+            while True:
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+                docs = db.collection("transactions")\
+                         .where("status", "==", status)\
+                         .where("expires_at", "<", cutoff)\
+                         .limit(TRANSITION_BATCH_LIMIT)\
+                         .get()
+                if not docs:
+                    break
+                
+                changed = TransactionManager.expire_transactions([doc.id for doc in docs])
+                expired += changed
+                if changed == 0 or len(docs) < TRANSITION_BATCH_LIMIT:
+                    break  # nothing movable left (or everything left raced with another worker)
+        
+        return expired
 
 # Global transaction manager instance
 transaction_manager = TransactionManager()